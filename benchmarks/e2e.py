@@ -0,0 +1,271 @@
+"""End-to-end benchmarks of the `llm` conversation path.
+
+Runs the real `handle_conversation` path offline, against the fake MCP stdio server in
+`fake_mcp_server.py` and the deterministic chat model in `scripted_model.py`, in a throwaway
+home directory. It reports:
+
+- startup: a direct answer with a cold and a warm tools cache
+- tool load: `load_tools` for a grid of servers x tools, cold and warm
+- tool call: per-call overhead of a tool call in a conversation, and of the MCP round trip
+- checkpoint write: one `AsyncSqliteSaver.aput` for conversations of growing length
+- streaming: rendered chunks per second, as text and as markdown
+
+Every scenario runs a few times and the fastest run is reported. Results can be saved as
+JSON and compared against a baseline, failing when a metric regresses beyond a tolerance.
+
+Usage:
+  python benchmarks/e2e.py [--quick] [--runs 3] [--json results.json]
+  python benchmarks/e2e.py --baseline results.json [--tolerance 1.5]
+"""
+
+import argparse
+import asyncio
+from contextlib import redirect_stdout
+import io
+import json
+import os
+from pathlib import Path
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+FAKE_SERVER = BENCHMARKS_DIR / "fake_mcp_server.py"
+
+
+def write_config(home: Path, servers: int, tools: int, schema_props: int = 5, call_delay: float = 0.0) -> None:
+    """Write an llm config with `servers` fake servers of `tools` tools each."""
+    config = {
+        "systemPrompt": "You are a benchmark assistant. Today is {today_datetime}. {memories}",
+        "llm": {"provider": "openai", "model": "scripted", "api_key": "benchmark"},
+        "mcpServers": {
+            f"bench_{n}": {
+                "command": sys.executable,
+                "args": [str(FAKE_SERVER), "--tools", str(tools), "--schema-props", str(schema_props),
+                         "--call-delay", str(call_delay)],
+            }
+            for n in range(servers)
+        },
+    }
+    config_dir = home / ".llm"
+    config_dir.mkdir(parents=True, exist_ok=True)
+    (config_dir / "config.json").write_text(json.dumps(config))
+
+
+class Benchmark:
+    """Runs the scenarios in an isolated home directory and collects the metrics.
+
+    Args:
+        home (Path): The home directory the CLI runs in
+        runs (int): Runs of every scenario, the fastest is reported
+    """
+
+    def __init__(self, home: Path, runs: int):
+        self.home = home
+        self.runs = runs
+        self.metrics: list[dict] = []
+
+    def add(self, name: str, value: float, unit: str) -> None:
+        self.metrics.append({"name": name, "value": value, "unit": unit})
+        print(f"{name:<48} {value:>10.2f} {unit}", file=sys.__stdout__, flush=True)
+
+    def use_script(self, responses, words_per_chunk: int = 1) -> None:
+        """Make the runtime's chat models answer from `responses`."""
+        import mcp_client_cli.agent as agent
+        from scripted_model import ScriptedChatModel
+
+        agent.init_chat_model = lambda **kwargs: ScriptedChatModel(
+            responses=responses, words_per_chunk=words_per_chunk
+        )
+
+    def reset_tools_cache(self) -> None:
+        """Forget the in-memory tools cache, as a new process would."""
+        import mcp_client_cli.storage as storage
+        storage._tools_cache = None
+
+    async def conversation(self, *flags: str, query: str = "benchmark query") -> float:
+        """Run one query through `handle_conversation` and return its wall-clock seconds."""
+        from mcp_client_cli import cli
+        from mcp_client_cli.config import AppConfig
+
+        sys.argv = ["llm", "--no-confirmations", *flags, query]
+        start = time.perf_counter()
+        args = cli.setup_argument_parser()
+        app_config = AppConfig.load()
+        query_message, is_continuation = cli.parse_query(args)
+        with redirect_stdout(io.StringIO()):
+            await cli.handle_conversation(args, query_message, is_continuation, app_config)
+        return time.perf_counter() - start
+
+    async def best(self, run, *args, **kwargs) -> float:
+        return min([await run(*args, **kwargs) for _ in range(self.runs)])
+
+    async def bench_startup(self) -> None:
+        from langchain_core.messages import AIMessage
+
+        write_config(self.home, servers=1, tools=20)
+        self.use_script([AIMessage(content="Paris.")])
+
+        async def cold():
+            return await self.conversation("--text-only", "--force-refresh")
+
+        async def warm():
+            self.reset_tools_cache()
+            return await self.conversation("--text-only")
+
+        self.add("startup, cold tools cache", await self.best(cold) * 1000, "ms")
+        self.add("startup, warm tools cache", await self.best(warm) * 1000, "ms")
+
+    async def bench_tool_load(self, servers_grid: list[int], tools_grid: list[int]) -> None:
+        from mcp_client_cli.config import AppConfig
+        from mcp_client_cli.tool import build_server_configs, close_toolkits, load_tools
+
+        async def load(force_refresh: bool) -> float:
+            self.reset_tools_cache()
+            start = time.perf_counter()
+            toolkits, _ = await load_tools(build_server_configs(AppConfig.load()), False, force_refresh)
+            elapsed = time.perf_counter() - start
+            await close_toolkits(toolkits)
+            return elapsed
+
+        for servers in servers_grid:
+            for tools in tools_grid:
+                write_config(self.home, servers=servers, tools=tools)
+                self.add(f"tool load {servers}x{tools}, cold", await self.best(load, True) * 1000, "ms")
+                self.add(f"tool load {servers}x{tools}, warm", await self.best(load, False) * 1000, "ms")
+
+    async def bench_tool_calls(self, calls: int) -> None:
+        from mcp_client_cli.timings import timings
+        from scripted_model import tool_call_script
+
+        write_config(self.home, servers=1, tools=20)
+        self.use_script(tool_call_script(calls))
+
+        # The script calls one tool per turn, so the time from the end of a call to the start
+        # of the next is what the conversation adds to every call: recording the result, the
+        # checkpoint, the model turn and dispatching the next call
+        overheads, round_trips = [], []
+        for _ in range(self.runs):
+            timings.enable()
+            await self.conversation("--text-only")
+            timings.enabled = False
+            phases = sorted((phase for phase in timings.phases if phase.name == "tool call"),
+                            key=lambda phase: phase.start)
+            overheads += [after.start - (before.start + before.duration)
+                          for before, after in zip(phases, phases[1:])]
+            round_trips += [phase.duration for phase in phases]
+
+        self.add("tool call overhead in a conversation (median)", statistics.median(overheads) * 1000, "ms")
+        # The first call of a run also waits for the server to start, the median leaves it out
+        self.add("tool call MCP round trip (median)", statistics.median(round_trips) * 1000, "ms")
+
+    async def bench_checkpoint_writes(self, lengths: list[int], writes: int = 20) -> None:
+        from langchain_core.messages import AIMessage, HumanMessage
+        from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        db_path = self.home / "checkpoints.db"
+        async with AsyncSqliteSaver.from_conn_string(str(db_path)) as saver:
+            for length in lengths:
+                messages = [
+                    (HumanMessage if n % 2 == 0 else AIMessage)(content=f"Message {n} " + "lorem ipsum " * 40)
+                    for n in range(length)
+                ]
+                checkpoint = empty_checkpoint()
+                checkpoint["channel_values"] = {"messages": messages}
+
+                async def write_all():
+                    config = {"configurable": {"thread_id": f"bench-{length}", "checkpoint_ns": ""}}
+                    start = time.perf_counter()
+                    for step in range(writes):
+                        config = await saver.aput(
+                            config, create_checkpoint(checkpoint, None, step), {"step": step}, {}
+                        )
+                    return (time.perf_counter() - start) / writes
+
+                self.add(f"checkpoint write, {length} messages", await self.best(write_all) * 1000, "ms")
+
+    async def bench_streaming(self, text_words: int, markdown_words: int) -> None:
+        from langchain_core.messages import AIMessage
+        from mcp_client_cli.timings import timings
+
+        write_config(self.home, servers=1, tools=20)
+
+        async def stream(words: int, *flags: str) -> float:
+            timings.enable()
+            await self.conversation(*flags)
+            timings.enabled = False
+            turn = next(phase for phase in timings.phases if phase.name == "conversation turn")
+            return turn.duration
+
+        self.use_script([AIMessage(content=" ".join(f"word{n}" for n in range(text_words)))])
+        self.add("streaming render, text", text_words / await self.best(stream, text_words, "--text-only"),
+                 "chunks/s")
+        self.use_script([AIMessage(content=" ".join(f"word{n}" for n in range(markdown_words)))])
+        self.add("streaming render, markdown", markdown_words / await self.best(stream, markdown_words),
+                 "chunks/s")
+
+
+def compare(metrics: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """List the metrics that regressed by more than `tolerance` times against the baseline."""
+    previous = {metric["name"]: metric["value"] for metric in baseline}
+    regressions = []
+    for metric in metrics:
+        base = previous.get(metric["name"])
+        # A metric that was not positive cannot serve as a baseline
+        if base is None or base <= 0 or metric["value"] <= 0:
+            continue
+        # Throughputs regress when they drop, durations when they grow
+        ratio = base / metric["value"] if metric["unit"].endswith("/s") else metric["value"] / base
+        if ratio > tolerance:
+            regressions.append(f"{metric['name']}: {metric['value']:.2f} {metric['unit']} "
+                               f"vs {base:.2f} in the baseline ({ratio:.2f}x worse)")
+    return regressions
+
+
+async def run_benchmarks(args: argparse.Namespace, home: Path) -> list[dict]:
+    benchmark = Benchmark(home, args.runs)
+    await benchmark.bench_startup()
+    if args.quick:
+        await benchmark.bench_tool_load([1, 4], [10, 100])
+    else:
+        await benchmark.bench_tool_load([1, 4, 8], [10, 100, 500])
+    await benchmark.bench_tool_calls(5 if args.quick else 20)
+    await benchmark.bench_checkpoint_writes([10, 100] if args.quick else [10, 100, 500])
+    await benchmark.bench_streaming(500 if args.quick else 2000, 200 if args.quick else 500)
+    return benchmark.metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the end-to-end benchmarks of the llm conversation path")
+    parser.add_argument("--quick", action="store_true", help="Run smaller scenarios, for CI")
+    parser.add_argument("--runs", type=int, default=3, help="Runs of every scenario, the fastest is reported")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --json")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="Fail when a metric is this many times worse than the baseline")
+    args = parser.parse_args()
+    json_path = Path(args.json).resolve() if args.json else None
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    with tempfile.TemporaryDirectory() as home:
+        # The CLI resolves its paths from the home directory at import time
+        os.environ["HOME"] = os.environ["USERPROFILE"] = home
+        os.chdir(home)
+        # Queries come from the arguments only, as if stdin were empty
+        sys.stdin = io.TextIOWrapper(io.BytesIO())
+        sys.path.insert(0, str(BENCHMARKS_DIR))
+        metrics = asyncio.run(run_benchmarks(args, Path(home)))
+
+    if json_path:
+        json_path.write_text(json.dumps({"metrics": metrics}, indent=2))
+    if baseline_path:
+        regressions = compare(metrics, json.loads(baseline_path.read_text())["metrics"], args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Fake MCP stdio server for the end-to-end benchmarks.
+
+Serves a configurable number of generated tools. Every tool takes the same generated input
+schema and returns a fixed-size text result, after the configured delays.
+
+Usage:
+  python benchmarks/fake_mcp_server.py [--tools 20] [--schema-props 5] [--call-delay 0] ...
+"""
+
+import argparse
+import asyncio
+
+import mcp.types as types
+from mcp.server.lowlevel import Server
+from mcp.server.stdio import stdio_server
+
+
+def build_tools(count: int, schema_props: int) -> list[types.Tool]:
+    """Generate `count` tools whose input schemas have `schema_props` string properties."""
+    properties = {
+        f"arg_{i}": {"type": "string", "description": f"Value of argument number {i}."}
+        for i in range(schema_props)
+    }
+    return [
+        types.Tool(
+            name=f"tool_{n}",
+            description=f"Benchmark tool number {n}. Returns a fixed-size text result.",
+            inputSchema={
+                "type": "object",
+                "properties": properties,
+                "required": list(properties)[:1],
+            },
+        )
+        for n in range(count)
+    ]
+
+
+async def serve(args: argparse.Namespace) -> None:
+    await asyncio.sleep(args.startup_delay)
+    tools = build_tools(args.tools, args.schema_props)
+    result = [types.TextContent(type="text", text="x" * args.result_size)]
+    server = Server("benchmark")
+
+    @server.list_tools()
+    async def list_tools() -> list[types.Tool]:
+        await asyncio.sleep(args.list_delay)
+        return tools
+
+    @server.call_tool(validate_input=False)
+    async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
+        await asyncio.sleep(args.call_delay)
+        return result
+
+    async with stdio_server() as (read, write):
+        await server.run(read, write, server.create_initialization_options())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake MCP stdio server for benchmarks")
+    parser.add_argument("--tools", type=int, default=20, help="Number of tools to serve")
+    parser.add_argument("--schema-props", type=int, default=5,
+                        help="Number of properties in every tool's input schema")
+    parser.add_argument("--result-size", type=int, default=100, help="Characters in every tool result")
+    parser.add_argument("--startup-delay", type=float, default=0.0, help="Seconds to wait before serving")
+    parser.add_argument("--list-delay", type=float, default=0.0, help="Seconds every tools/list takes")
+    parser.add_argument("--call-delay", type=float, default=0.0, help="Seconds every tools/call takes")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Import-time budget check for the `llm` entry point.
+
+Runs `llm` commands under `python -X importtime` and fails when a command imports a module
+it does not need, or when its total import time exceeds the budget. Each command runs a few
+times and the fastest run is compared against the budget, to keep CI noise out.
+
+Usage:
+  python benchmarks/import_budget.py [--budget-scale 1.5] [--runs 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+AGENT_MODULES = ["langchain", "langchain_core", "langgraph", "mcp", "aiosqlite"]
+PROVIDER_MODULES = ["anthropic", "openai", "google.genai", "langchain_anthropic",
+                    "langchain_openai", "langchain_google_genai"]
+
+# command: (forbidden module prefixes, import budget in milliseconds)
+COMMANDS = {
+    "--help": (AGENT_MODULES + PROVIDER_MODULES, 250),
+    "--list-prompts": (AGENT_MODULES + PROVIDER_MODULES, 300),
+    "--show-memories": (["langchain", "langgraph.prebuilt", "langgraph.graph", "langgraph.checkpoint",
+                         "mcp"] + PROVIDER_MODULES, 700),
+}
+
+
+def measure(command: str, home: str) -> tuple[float, list[str]]:
+    """Run `llm <command>` under -X importtime.
+
+    Returns:
+        tuple[float, list[str]]: Total import time in milliseconds and the imported module names.
+    """
+    env = {**os.environ, "HOME": home, "USERPROFILE": home}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "mcp_client_cli.cli", command],
+        capture_output=True, text=True, env=env, stdin=subprocess.DEVNULL,
+    )
+    if proc.returncode != 0:
+        errors = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+        raise SystemExit(f"llm {command} failed:\n{errors}")
+
+    total_us = 0
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append(name.strip())
+        # Top-level imports are indented by a single space, nested ones by more.
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the import-time budget of the llm entry point")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="Multiply every budget, for slow machines")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per command, the fastest one counts")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as home:
+        for command, (forbidden, budget_ms) in COMMANDS.items():
+            results = [measure(command, home) for _ in range(args.runs)]
+            total_ms, modules = min(results, key=lambda r: r[0])
+            budget_ms *= args.budget_scale
+            leaked = sorted({
+                module for module in modules
+                if any(module == prefix or module.startswith(prefix + ".") for prefix in forbidden)
+            })
+            status = "ok" if total_ms <= budget_ms and not leaked else "FAIL"
+            print(f"{status:4} llm {command:16} {total_ms:8.1f} ms (budget {budget_ms:.0f} ms)")
+            if total_ms > budget_ms:
+                failures.append(f"llm {command} took {total_ms:.1f} ms to import, budget is {budget_ms:.0f} ms")
+            if leaked:
+                failures.append(f"llm {command} imported {', '.join(leaked[:10])}")
+
+    if failures:
+        print("\n".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
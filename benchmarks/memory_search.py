@@ -0,0 +1,121 @@
+"""Benchmark of approximate memory search: recall against latency.
+
+Fills a `SqliteStore` with clustered synthetic embeddings, as real text embeddings are, and
+compares exact search against the approximate IVF index for a range of probed lists. It
+reports, for every setting:
+
+- search latency: median time of one search of the top 10 memories
+- recall: the share of the exact top 10 the approximate search returns
+
+Usage:
+  python benchmarks/memory_search.py [--memories 50000] [--dims 256] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import PutOp
+
+from mcp_client_cli.memory import SqliteStore
+from mcp_client_cli.vector_index import list_count
+
+LIMIT = 10
+PROBES = [1, 2, 4, 8, 16, 32, 64]
+
+
+class TableEmbeddings(Embeddings):
+    """Embeddings looked up from a table of texts, standing in for an embedding model."""
+
+    def __init__(self, vectors: dict[str, list[float]]):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.vectors[text]
+
+
+def build_vectors(args: argparse.Namespace) -> dict[str, list[float]]:
+    """Generate memories around random topics, and queries near some of the memories."""
+    rng = np.random.default_rng(0)
+    topics = rng.normal(size=(args.topics, args.dims))
+    memories = topics[rng.integers(args.topics, size=args.memories)] + rng.normal(
+        scale=1.2, size=(args.memories, args.dims))
+    queries = memories[rng.integers(args.memories, size=args.queries)] + rng.normal(
+        scale=0.8, size=(args.queries, args.dims))
+    vectors = {f"memory {i}": vector.tolist() for i, vector in enumerate(memories)}
+    vectors.update({f"query {i}": vector.tolist() for i, vector in enumerate(queries)})
+    return vectors
+
+
+async def search_all(store: SqliteStore, queries: int) -> tuple[list[list[str]], float]:
+    """Run every query, returning the keys found and the median latency in milliseconds."""
+    found, latencies = [], []
+    for i in range(queries):
+        start = time.perf_counter()
+        items = await store.asearch(("memories",), query=f"query {i}", limit=LIMIT)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append([item.key for item in items])
+    return found, statistics.median(latencies)
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    metrics = []
+
+    def add(name: str, value: float, unit: str) -> None:
+        metrics.append({"name": name, "value": value, "unit": unit})
+        print(f"{name:<48} {value:>10.2f} {unit}", flush=True)
+
+    index = {"dims": args.dims, "embed": TableEmbeddings(build_vectors(args)), "fields": ["data"]}
+    path = Path(tempfile.mkdtemp()) / "conversations.db"
+    store = SqliteStore(path, index=index, ann_index=True)
+    start = time.perf_counter()
+    for offset in range(0, args.memories, 1000):
+        await store.abatch([
+            PutOp(("memories", "myself"), f"k{i}", {"data": f"memory {i}"})
+            for i in range(offset, min(offset + 1000, args.memories))
+        ])
+    add(f"store {args.memories} memories, with index training", time.perf_counter() - start, "s")
+    add("index lists", list_count(args.memories), "lists")
+
+    exact_store = SqliteStore(path, index=index)
+    exact, latency = await search_all(exact_store, args.queries)
+    await exact_store.aclose()
+    add(f"exact search, top {LIMIT} (median)", latency, "ms")
+
+    for probes in PROBES:
+        store.ann_probes = probes
+        found, latency = await search_all(store, args.queries)
+        recall = statistics.mean(len(set(a) & set(e)) / len(e) for a, e in zip(found, exact))
+        add(f"approximate search, {probes} probes (median)", latency, "ms")
+        add(f"recall@{LIMIT}, {probes} probes", recall * 100, "%")
+    await store.aclose()
+    return metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark approximate memory search")
+    parser.add_argument("--memories", type=int, default=50000, help="Number of memories stored")
+    parser.add_argument("--dims", type=int, default=256, help="Dimensions of the embeddings")
+    parser.add_argument("--topics", type=int, default=1000, help="Clusters the memories are drawn around")
+    parser.add_argument("--queries", type=int, default=100, help="Number of searches per setting")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+    metrics = asyncio.run(run(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps({"metrics": metrics}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Deterministic chat model for the end-to-end benchmarks.
+
+The model replays a fixed list of responses. The response is picked by counting the model
+turns since the last user message, so every run of the same query gets the same answers,
+whatever ran before it in the process.
+"""
+
+import json
+from typing import Any, Iterator, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that answers from a script.
+
+    Attributes:
+        responses (list[AIMessage]): The response of each model turn; the last one repeats
+        words_per_chunk (int): Words of content sent in every streamed chunk
+    """
+    responses: list[AIMessage]
+    words_per_chunk: int = 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    def _next_response(self, messages: list[BaseMessage]) -> AIMessage:
+        turn = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                turn += 1
+        return self.responses[min(turn, len(self.responses) - 1)]
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next_response(messages))])
+
+    def _stream(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        response = self._next_response(messages)
+        words = response.content.split(" ") if response.content else [""]
+        for start in range(0, len(words), self.words_per_chunk):
+            content = " ".join(words[start:start + self.words_per_chunk])
+            chunk = AIMessageChunk(
+                content=content if start == 0 else " " + content,
+                tool_call_chunks=[] if start else [
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                    for index, call in enumerate(response.tool_calls)
+                ],
+            )
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+
+def tool_call_script(calls: int, tool_name: str = "tool_0", answer: str = "Done.") -> list[AIMessage]:
+    """Build a script that calls `tool_name` once per turn, `calls` times, then answers."""
+    return [
+        AIMessage(content="", tool_calls=[{"name": tool_name, "args": {"arg_0": "value"}, "id": f"call_{n}"}])
+        for n in range(calls)
+    ] + [AIMessage(content=answer)]
@@ -0,0 +1,175 @@
+"""Benchmark of retrieval-based tool selection.
+
+Builds a synthetic catalog of MCP-like tools across many services, and compares binding all
+of them against binding the tools `ToolSelector` picks for a set of queries. It reports:
+
+- prompt tokens: the tool schemas sent to the model on every turn, all tools vs selected
+- bind latency: `bind_tools` on an OpenAI chat model, all tools vs selected
+- selection latency: building the BM25 index, and ranking one query
+- recall: how often the tool a query asks for is among the selected tools
+
+Usage:
+  python benchmarks/tool_selection.py [--tools 240] [--top-k 20] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from mcp_client_cli.const import BYTES_PER_TOKEN
+from mcp_client_cli.tool_selection import ToolSelector
+
+SERVICES = {
+    "github": ["issue", "pull request", "repository", "branch", "commit", "release"],
+    "slack": ["message", "channel", "thread", "reaction", "user"],
+    "calendar": ["event", "calendar", "attendee", "reminder"],
+    "gmail": ["email", "draft", "label", "attachment"],
+    "jira": ["ticket", "sprint", "board", "comment"],
+    "postgres": ["table", "row", "query", "index", "schema"],
+    "filesystem": ["file", "directory", "symlink", "permission"],
+    "docker": ["container", "image", "volume", "network"],
+    "kubernetes": ["pod", "deployment", "service", "secret"],
+    "notion": ["page", "database", "block"],
+    "browser": ["tab", "screenshot", "cookie", "download"],
+    "weather": ["forecast", "alert", "station"],
+}
+ACTIONS = {
+    "create": ["add", "make", "open"],
+    "list": ["show all", "enumerate", "display"],
+    "get": ["fetch", "read", "look up"],
+    "update": ["edit", "change", "modify"],
+    "delete": ["remove", "drop", "erase"],
+    "search": ["find", "look for", "query"],
+}
+
+
+def build_tools() -> list[StructuredTool]:
+    """Generate one tool per service, action and object, with a realistic input schema."""
+    async def run(**kwargs) -> str:
+        return "ok"
+
+    tools = []
+    for service, objects in SERVICES.items():
+        for obj in objects:
+            for action in ACTIONS:
+                name = f"{service}_{action}_{obj.replace(' ', '_')}"
+                properties = {
+                    "id": {"type": "string", "title": "Id", "description": f"Identifier of the {obj}."},
+                    "query": {"type": "string", "title": "Query", "description": "Free text filter."},
+                    "limit": {"type": "integer", "title": "Limit", "default": 20,
+                              "description": "Maximum number of results to return."},
+                    "fields": {"type": "array", "items": {"type": "string"}, "title": "Fields",
+                               "description": f"Fields of the {obj} to include in the response."},
+                }
+                tools.append(StructuredTool(
+                    name=name,
+                    description=f"{action.capitalize()} a {obj} in {service.capitalize()}. "
+                                f"Use this to {action} {obj}s through the {service} API.",
+                    args_schema={"type": "object", "properties": properties, "required": ["id"]},
+                    coroutine=run,
+                ))
+    return tools
+
+
+def build_queries(count: int, seed: int = 0) -> list[tuple[str, str]]:
+    """Generate natural queries, each asking for one tool of the catalog, with synonyms."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        service = rng.choice(list(SERVICES))
+        obj = rng.choice(SERVICES[service])
+        action = rng.choice(list(ACTIONS))
+        verb = rng.choice([action] + ACTIONS[action])
+        query = rng.choice([
+            f"Can you {verb} the {obj} on {service} for me?",
+            f"Please {verb} my {service} {obj} called launch-plan",
+            f"I need to {verb} a {obj} in {service} before the meeting",
+        ])
+        queries.append((query, f"{service}_{action}_{obj.replace(' ', '_')}"))
+    return queries
+
+
+def schema_tokens(tools) -> int:
+    return len(json.dumps([convert_to_openai_tool(tool) for tool in tools])) // BYTES_PER_TOKEN
+
+
+def timed(fn, runs: int = 5) -> float:
+    """Fastest of `runs` calls of `fn`, in milliseconds."""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    metrics = []
+
+    def add(name: str, value: float, unit: str) -> None:
+        metrics.append({"name": name, "value": value, "unit": unit})
+        print(f"{name:<48} {value:>10.2f} {unit}", flush=True)
+
+    tools = build_tools()
+    while len(tools) < args.tools:
+        tools += [tool.model_copy(update={"name": f"{tool.name}_{len(tools)}"}) for tool in tools]
+    tools = tools[:args.tools]
+    queries = build_queries(args.queries)
+
+    add(f"index build, {len(tools)} tools", timed(lambda: ToolSelector(tools, args.top_k)), "ms")
+    selector = ToolSelector(tools, args.top_k)
+
+    selections, latencies, hits = [], [], 0
+    for query, target in queries:
+        start = time.perf_counter()
+        selected = await selector.select([HumanMessage(content=query)])
+        latencies.append((time.perf_counter() - start) * 1000)
+        # Later selections of the same query are served from the ranking cache
+        selector._rankings.clear()
+        selections.append(selected)
+        hits += any(tool.name == target for tool in selected)
+    add("selection per query (median)", statistics.median(latencies), "ms")
+    add(f"recall of the asked tool in top {args.top_k}", hits / len(queries) * 100, "%")
+
+    all_tokens = schema_tokens(tools)
+    selected_tokens = statistics.mean(schema_tokens(selected) for selected in selections)
+    add(f"tool schema tokens, all {len(tools)} tools", all_tokens, "tokens")
+    add(f"tool schema tokens, top {args.top_k} (mean)", selected_tokens, "tokens")
+    add("tool schema tokens saved per model turn", (1 - selected_tokens / all_tokens) * 100, "%")
+
+    try:
+        from langchain_openai import ChatOpenAI
+    except ImportError:
+        print("langchain-openai is not installed, skipping the bind latency", file=sys.stderr)
+    else:
+        model = ChatOpenAI(model="gpt-4o", api_key="benchmark")
+        add(f"bind_tools, all {len(tools)} tools", timed(lambda: model.bind_tools(tools)), "ms")
+        add(f"bind_tools, top {args.top_k}", timed(lambda: model.bind_tools(selections[0])), "ms")
+    return metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark retrieval-based tool selection")
+    parser.add_argument("--tools", type=int, default=240, help="Number of tools in the catalog")
+    parser.add_argument("--top-k", type=int, default=20, help="Tools selected per query")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries to select for")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+    metrics = asyncio.run(run(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps({"metrics": metrics}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Agent runtime that keeps the whole LangGraph stack warm.
+
+A runtime owns the MCP toolkits, the chat model, the checkpointer connection, the memory
+store and the compiled agent graph. A one-shot `llm` invocation builds one runtime for a
+single query, while the daemon keeps one alive and reuses it for every request.
+"""
+
+import asyncio
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Annotated, AsyncIterator, List, Optional, TypedDict
+import subprocess
+import sys
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedStore, create_react_agent
+from langgraph.store.base import BaseStore, PutOp
+from langgraph.managed import IsLastStep
+from langgraph.graph.message import add_messages
+from langchain.chat_models import init_chat_model
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from .config import AppConfig
+from .const import PREWARM_MIN_SCORE, SQLITE_DB, TOOL_OUTPUT_PAGE_BYTES, TOOL_RESULT_IMAGE_PROVIDERS
+from .memory import SqliteStore, get_memories
+from .storage import (
+    ConversationManager, get_server_usage_score, get_server_usage_scores, read_tool_output_page,
+    record_server_usage
+)
+from .timings import timings
+from .tool import McpToolkit, build_server_configs, close_toolkits, load_tools
+from .tool_selection import ToolSelector
+
+# The AgentState class is used to maintain the state of the agent during a conversation.
+class AgentState(TypedDict):
+    # A list of messages exchanged in the conversation.
+    messages: Annotated[list[BaseMessage], add_messages]
+    # A flag indicating whether the current step is the last step in the conversation.
+    is_last_step: IsLastStep
+    # The current date and time, used for context in the conversation.
+    today_datetime: str
+    # The user's memories.
+    memories: str = "no memories"
+    remaining_steps: int = 5
+
+@tool
+async def save_memory(memories: List[str], *, config: RunnableConfig, store: Annotated[BaseStore, InjectedStore()]) -> str:
+    '''Save the given memory for the current user. Do not save duplicate memories.'''
+    user_id = config.get("configurable", {}).get("user_id")
+    namespace = ("memories", user_id)
+    # One batch, so all memories are written in a single transaction
+    await store.abatch([
+        PutOp(namespace, f"memory_{uuid.uuid4().hex}", {"data": memory})
+        for memory in memories
+    ])
+    return f"Saved memories: {memories}"
+
+@tool
+def read_tool_output(handle: str, offset: int = 0, length: int = TOOL_OUTPUT_PAGE_BYTES) -> str:
+    '''Read part of a tool output that was too large to return in full. Pass the handle from the truncation notice and the byte offset to start reading at.'''
+    try:
+        data, size = read_tool_output_page(handle, offset, min(length, TOOL_OUTPUT_PAGE_BYTES))
+    except (ValueError, OSError) as e:
+        return f"Error: {e}"
+    end = offset + len(data)
+    return f"[Bytes {offset}-{end} of {size}{'' if end < size else ', end of output'}]\n{data.decode(errors='ignore')}"
+
+class AgentRuntime:
+    """Warm agent stack shared across queries.
+
+    Args:
+        app_config (AppConfig): The loaded application configuration
+        no_tools (bool): Do not load any MCP tools
+        force_refresh (bool): Force refresh of the tools cache while loading
+    """
+
+    def __init__(self, app_config: AppConfig, *, no_tools: bool = False, force_refresh: bool = False):
+        self.app_config = app_config
+        self.no_tools = no_tools
+        self.force_refresh = force_refresh
+        self.toolkits: list[McpToolkit] = []
+        self.tools: list = []
+        self.tool_selector: Optional[ToolSelector] = None
+        self.checkpointer: Optional[AsyncSqliteSaver] = None
+        self.store: Optional[SqliteStore] = None
+        self.conversation_manager = ConversationManager(SQLITE_DB)
+        self._models: dict[str, BaseChatModel] = {}
+        self._agents: dict[tuple[str, bool], object] = {}
+        self._prompt: Optional[ChatPromptTemplate] = None
+        self._stack: Optional[AsyncExitStack] = None
+        self._background_tasks: set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "AgentRuntime":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """Load the tools and open the database connections."""
+        self._stack = AsyncExitStack()
+        self.toolkits, self.tools = await load_tools(
+            build_server_configs(self.app_config), self.no_tools, self.force_refresh
+        )
+        if not self.no_tools:
+            self._build_tool_selector()
+            self.tools.extend(self._builtin_tools())
+
+        self._prompt = ChatPromptTemplate.from_messages([
+            ("system", self.app_config.system_prompt),
+            ("placeholder", "{messages}")
+        ]).partial(today_datetime=datetime.now().isoformat())
+
+        with timings.phase("checkpointer open"):
+            self.checkpointer = await self._stack.enter_async_context(
+                AsyncSqliteSaver.from_conn_string(SQLITE_DB)
+            )
+        self.store = SqliteStore(SQLITE_DB)
+
+    async def close(self) -> None:
+        """Close the database connections and all toolkits."""
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self._stack:
+            await self._stack.aclose()
+            self._stack = None
+        if self.store:
+            await self.store.aclose()
+        with timings.phase("toolkit shutdown", f"{len(self.toolkits)} servers"):
+            await close_toolkits(self.toolkits)
+        self.toolkits = []
+
+    def _builtin_tools(self) -> list:
+        """Return the tools provided by the client itself rather than an MCP server."""
+        tools = [save_memory]
+        if any(toolkit.has_output_budget for toolkit in self.toolkits):
+            tools.append(read_tool_output)
+        if self.tool_selector:
+            tools.append(self.tool_selector.find_tools_tool())
+        return tools
+
+    def _build_tool_selector(self) -> None:
+        """Index the MCP tools for per-query selection, when there are more than `top_k` of them."""
+        config = self.app_config.tool_selection
+        self.tool_selector = None
+        if not config.top_k or len(self.tools) <= config.top_k:
+            return
+        embeddings = None
+        if config.embedding_model:
+            from langgraph.store.base import ensure_embeddings
+            embeddings = ensure_embeddings(config.embedding_model)
+        self.tool_selector = ToolSelector(
+            list(self.tools), config.top_k, config.pinned_tools, embeddings, config.embedding_model
+        )
+
+    def _tool_selecting_model(self, model: BaseChatModel):
+        """Wrap a model so each turn binds only the tools the selector picks.
+
+        All tools stay registered with the agent, so any tool the model is given can run.
+        Tools the selector does not index, the built-in ones, are always bound.
+        """
+        selector = self.tool_selector
+        builtins = [tool for tool in self.tools if tool not in selector]
+        bound_models = {}
+
+        async def select_model(state: AgentState, runtime) -> BaseChatModel:
+            with timings.phase("tool selection") as phase:
+                tools = await selector.select(state["messages"]) + builtins
+                phase.detail = f"{len(tools)} of {len(self.tools)} tools"
+            key = tuple(tool.name for tool in tools)
+            if key not in bound_models:
+                if len(bound_models) >= 32:
+                    bound_models.clear()
+                bound_models[key] = model.bind_tools(tools)
+            return bound_models[key]
+
+        return select_model
+
+    def _get_model(self, model_name: str) -> BaseChatModel:
+        """Return the chat model client for `model_name`, creating it on first use."""
+        if model_name not in self._models:
+            llm = self.app_config.llm
+            extra_body = {}
+            if llm.base_url and "openrouter" in llm.base_url:
+                extra_body = {"transforms": ["middle-out"]}
+            with timings.phase("init_chat_model", model_name):
+                self._models[model_name] = init_chat_model(
+                    model=model_name,
+                    model_provider=llm.provider,
+                    api_key=llm.api_key,
+                    temperature=llm.temperature,
+                    base_url=llm.base_url,
+                    default_headers={
+                        "X-Title": "mcp-client-cli",
+                        "HTTP-Referer": "https://github.com/adhikasp/mcp-client-cli",
+                    },
+                    extra_body=extra_body
+                )
+        return self._models[model_name]
+
+    def _get_agent(self, model_name: str, no_tools: bool):
+        """Return the compiled agent graph for a model, compiling it on first use."""
+        key = (model_name, no_tools)
+        if key not in self._agents:
+            model = self._get_model(model_name)
+            if self.tool_selector and not no_tools:
+                model = self._tool_selecting_model(model)
+            with timings.phase("agent compile", f"{0 if no_tools else len(self.tools)} tools"):
+                self._agents[key] = create_react_agent(
+                    model, [] if no_tools else self.tools,
+                    state_schema=AgentState, prompt=self._prompt,
+                    checkpointer=self.checkpointer, store=self.store
+                )
+        return self._agents[key]
+
+    def _prewarm_sessions(self) -> None:
+        """Start the sessions of servers likely to be called while the first model turn is in flight.
+
+        Servers are picked by the usage scores recorded from previous runs. Servers without
+        recorded runs are pre-warmed, as there is no evidence against them yet.
+        """
+        scores = get_server_usage_scores()
+        for toolkit in self.toolkits:
+            if toolkit.has_session:
+                continue
+            score = get_server_usage_score(toolkit.server_param, scores)
+            if score is not None and score < PREWARM_MIN_SCORE:
+                continue
+            task = asyncio.create_task(toolkit.prewarm())
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    def start_idle_reaper(self) -> None:
+        """Close MCP sessions that stay idle longer than their server's `idle_timeout`.
+
+        Evicted servers are respawned lazily by the next tool call. Only long-lived runtimes,
+        the REPL and the daemon, need this.
+        """
+        timeouts = [toolkit.idle_timeout for toolkit in self.toolkits if toolkit.idle_timeout]
+        if not timeouts:
+            return
+        interval = min(max(min(timeouts) / 4, 1), 30)
+        task = asyncio.create_task(self._reap_idle_sessions(interval))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _reap_idle_sessions(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for toolkit in self.toolkits:
+                await toolkit.evict_if_idle()
+
+    def schedule_tools_refresh(self) -> None:
+        """Revalidate stale tool lists in the background, for long-lived runtimes.
+
+        Stale tools keep being served until the refresh completes. The agents are then
+        recompiled with the new tools on their next use.
+        """
+        if not any(toolkit.tools_stale for toolkit in self.toolkits):
+            return
+        task = asyncio.create_task(self._refresh_tools())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _refresh_tools(self) -> None:
+        results = await asyncio.gather(
+            *(toolkit.refresh_tools() for toolkit in self.toolkits if toolkit.tools_stale),
+            return_exceptions=True
+        )
+        if all(isinstance(result, BaseException) for result in results):
+            return
+        self.tools = [tool for toolkit in self.toolkits for tool in toolkit.get_tools()]
+        self._build_tool_selector()
+        self.tools.extend(self._builtin_tools())
+        self._agents.clear()
+
+    def spawn_tools_refresh(self) -> None:
+        """Revalidate stale tool lists in a detached process, for one-shot runs.
+
+        The process outlives this one, so the shell gets control back right after the
+        response while the next run finds a fresh cache.
+        """
+        names = [toolkit.name for toolkit in self.toolkits if toolkit.tools_stale]
+        if not names:
+            return
+        if sys.platform == "win32":
+            detach = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            detach = {"start_new_session": True}
+        try:
+            subprocess.Popen(
+                [sys.executable, "-m", "mcp_client_cli.cli", "--refresh-tools", *names],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                **detach
+            )
+        except OSError:
+            pass
+
+    async def get_thread_id(self, is_conversation_continuation: bool) -> str:
+        """Return the thread to run the query in."""
+        if is_conversation_continuation:
+            return await self.conversation_manager.get_last_id()
+        return uuid.uuid4().hex
+
+    async def save_thread_id(self, thread_id: str) -> None:
+        """Remember `thread_id` as the last conversation."""
+        await self.conversation_manager.save_id(thread_id, self.checkpointer.conn)
+
+    async def astream(self, query: HumanMessage, thread_id: str, *,
+                      model: Optional[str] = None, no_tools: Optional[bool] = None,
+                      tool_cache: bool = True) -> AsyncIterator:
+        """Run the agent on `query` and stream its `messages` and `values` chunks.
+
+        Args:
+            query (HumanMessage): The user message
+            thread_id (str): The conversation thread to run in
+            model (Optional[str]): Override the model specified in config
+            no_tools (Optional[bool]): Do not bind any tools, defaults to the runtime setting
+            tool_cache (bool): Serve cacheable tool calls from the tool result cache
+        """
+        no_tools = self.no_tools if no_tools is None else no_tools
+        if not no_tools:
+            self._prewarm_sessions()
+        call_counts = {toolkit.name: toolkit.call_count for toolkit in self.toolkits}
+
+        with timings.phase("memory fetch"):
+            memories = await get_memories(self.store)
+        agent_executor = self._get_agent(model or self.app_config.llm.model, no_tools)
+        input_messages = AgentState(
+            messages=[query],
+            today_datetime=datetime.now().isoformat(),
+            memories="\n".join(f"- {memory}" for memory in memories),
+            remaining_steps=3
+        )
+        stream_start = turn_start = time.perf_counter()
+        first_token = True
+        async for chunk in agent_executor.astream(
+            input_messages,
+            stream_mode=["messages", "values"],
+            config={"configurable": {
+                "thread_id": thread_id, "user_id": "myself", "tool_cache": tool_cache,
+                "tool_images": self.app_config.llm.provider in TOOL_RESULT_IMAGE_PROVIDERS,
+            },
+                    "recursion_limit": 100}
+        ):
+            if timings.enabled:
+                mode, data = chunk
+                if mode == "messages" and first_token and isinstance(data[0], AIMessage):
+                    timings.record("time to first token", stream_start)
+                    first_token = False
+                elif mode == "values":
+                    message = data["messages"][-1]
+                    if isinstance(message, AIMessage):
+                        # A model turn runs from its input being ready to its full response
+                        calls = len(message.tool_calls)
+                        timings.record("model turn", turn_start, f"{calls} tool calls" if calls else "final")
+                    else:
+                        turn_start = time.perf_counter()
+            yield chunk
+
+        if not no_tools and self.toolkits:
+            record_server_usage([
+                (toolkit.server_param, toolkit.call_count > call_counts[toolkit.name])
+                for toolkit in self.toolkits
+            ])
@@ -4,68 +4,78 @@
 Simple llm CLI that acts as MCP client.
 """
 
-from datetime import datetime
 import argparse
 import asyncio
+from contextlib import aclosing
 import os
-from typing import Annotated, TypedDict
-import uuid
 import sys
 import re
-import anyio
-from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.language_models.chat_models import BaseChatModel
-from langgraph.prebuilt import create_react_agent
-from langgraph.managed import IsLastStep
-from langgraph.graph.message import add_messages
-from langchain.chat_models import init_chat_model
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
-from rich.console import Console
-from rich.table import Table
+import threading
 import base64
 import imghdr as imghdr
 import mimetypes
+from typing import TYPE_CHECKING
 
 from .input import *
 from .const import *
-from .output import *
-from .storage import *
-from .tool import *
 from .prompt import *
-from .memory import *
 from .config import AppConfig
+from .timings import timings
 
-# The AgentState class is used to maintain the state of the agent during a conversation.
-class AgentState(TypedDict):
-    # A list of messages exchanged in the conversation.
-    messages: Annotated[list[BaseMessage], add_messages]
-    # A flag indicating whether the current step is the last step in the conversation.
-    is_last_step: IsLastStep
-    # The current date and time, used for context in the conversation.
-    today_datetime: str
-    # The user's memories.
-    memories: str = "no memories"
-    remaining_steps: int = 5
+# Heavy modules (langchain, langgraph, mcp, rich) are imported inside the handlers that
+# need them, so `--help`, `--list-prompts` and `--show-memories` start quickly.
+if TYPE_CHECKING:
+    from langchain_core.messages import HumanMessage
 
 async def run() -> None:
     """Run the LLM agent."""
     args = setup_argument_parser()
-    query, is_conversation_continuation = parse_query(args)
-    app_config = AppConfig.load()
-    
-    if args.list_tools:
-        await handle_list_tools(app_config, args)
+    if args.timings:
+        timings.enable()
+    try:
+        await run_command(args)
+    finally:
+        if args.timings:
+            timings.report(args.timings_format)
+
+async def run_command(args: argparse.Namespace) -> None:
+    """Run the command selected by the arguments."""
+    if args.list_prompts:
+        handle_list_prompts()
         return
-    
+
     if args.show_memories:
         await handle_show_memories()
         return
-        
-    if args.list_prompts:
-        handle_list_prompts()
+
+    with timings.phase("config load"):
+        app_config = AppConfig.load()
+
+    if args.refresh_tools:
+        await handle_refresh_tools(app_config, args.refresh_tools)
         return
-        
+
+    if args.list_tools:
+        await handle_list_tools(app_config, args)
+        return
+
+    if args.daemon:
+        from .daemon import AgentDaemon
+        await AgentDaemon(app_config, force_refresh=args.force_refresh).serve()
+        return
+
+    query, is_conversation_continuation = parse_query(args)
+
+    if args.repl:
+        await handle_repl(args, query, is_conversation_continuation, app_config)
+        return
+
+    # A daemon run would hide the phases being timed
+    if not args.force_refresh and not args.timings:
+        from .daemon import run_client
+        if await run_client(args, query, is_conversation_continuation, app_config):
+            return
+
     await handle_conversation(args, query, is_conversation_continuation, app_config)
 
 def setup_argument_parser() -> argparse.Namespace:
@@ -82,6 +92,10 @@ Examples:
   llm --list-tools                         Show available tools
   llm --list-prompts                       Show available prompt templates
   llm --no-confirmations "search web"      Run tools without confirmation
+  llm --no-tool-cache "fetch the news"     Call cacheable tools again instead of reusing results
+  llm --repl                               Chat interactively in one process
+  llm --daemon                             Keep the agent warm for later queries
+  llm --timings "hi"                       Report where the run spent its time
         """
     )
     parser.add_argument('query', nargs='*', default=[],
@@ -97,6 +111,8 @@ Examples:
                        help='Bypass tool confirmation requirements')
     parser.add_argument('--force-refresh', action='store_true',
                        help='Force refresh of tools capabilities')
+    parser.add_argument('--no-tool-cache', action='store_true',
+                       help='Do not serve tool calls from the tool result cache')
     parser.add_argument('--text-only', action='store_true',
                        help='Print output as raw text instead of parsing markdown')
     parser.add_argument('--no-tools', action='store_true',
@@ -107,23 +123,27 @@ Examples:
                        help='Show user memories')
     parser.add_argument('--model',
                        help='Override the model specified in config')
+    parser.add_argument('--repl', action='store_true',
+                       help='Start an interactive session that keeps servers and the model warm across turns')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Run a background agent daemon that later llm invocations connect to')
+    parser.add_argument('--timings', action='store_true',
+                       help='Print a breakdown of where the run spent its time to stderr')
+    parser.add_argument('--timings-format', choices=['table', 'json'], default='table',
+                       help='Format of the --timings report (default: table)')
+    # Used internally to revalidate stale tool caches after a one-shot run
+    parser.add_argument('--refresh-tools', nargs='+', metavar='SERVER',
+                       help=argparse.SUPPRESS)
     return parser.parse_args()
 
 async def handle_list_tools(app_config: AppConfig, args: argparse.Namespace) -> None:
     """Handle the --list-tools command."""
-    server_configs = [
-        McpServerConfig(
-            server_name=name,
-            server_param=StdioServerParameters(
-                command=config.command,
-                args=config.args or [],
-                env={**(config.env or {}), **os.environ}
-            ),
-            exclude_tools=config.exclude_tools or []
-        )
-        for name, config in app_config.get_enabled_servers().items()
-    ]
-    toolkits, tools = await load_tools(server_configs, args.no_tools, args.force_refresh)
+    from rich.console import Console
+    from rich.table import Table
+    from .storage import get_compaction_stats
+    from .tool import McpTool, build_server_configs, close_toolkits, load_tools
+
+    toolkits, tools = await load_tools(build_server_configs(app_config), args.no_tools, args.force_refresh)
     
     console = Console()
     table = Table(title="Available LLM Tools")
@@ -137,13 +157,40 @@ async def handle_list_tools(app_config: AppConfig, args: argparse.Namespace) ->
 
     console.print(table)
 
+    table = Table(title="Tool Schema Compaction")
+    table.add_column("Toolkit", style="cyan")
+    table.add_column("Tokens Before", justify="right")
+    table.add_column("Tokens After", justify="right")
+    table.add_column("Saved", justify="right", style="green")
     for toolkit in toolkits:
-        await toolkit.close()
+        stats = get_compaction_stats(toolkit.server_param)
+        if stats and stats.original_tokens:
+            saved = 1 - stats.compact_tokens / stats.original_tokens
+            table.add_row(toolkit.name, str(stats.original_tokens), str(stats.compact_tokens), f"{saved:.0%}")
+    if table.rows:
+        console.print(table)
+
+    await close_toolkits(toolkits)
+
+async def handle_refresh_tools(app_config: AppConfig, server_names: list[str]) -> None:
+    """Handle the --refresh-tools command, refetching the tool lists of the given servers."""
+    from .tool import build_server_configs, close_toolkits, load_tools
+
+    server_configs = [
+        config for config in build_server_configs(app_config) if config.server_name in server_names
+    ]
+    toolkits, _ = await load_tools(server_configs, no_tools=False, force_refresh=True)
+    await close_toolkits(toolkits)
 
 async def handle_show_memories() -> None:
     """Handle the --show-memories command."""
+    from rich.console import Console
+    from rich.table import Table
+    from .memory import SqliteStore, get_memories
+
     store = SqliteStore(SQLITE_DB)
     memories = await get_memories(store)
+    await store.aclose()
     console = Console()
     table = Table(title="My LLM Memories")
     for memory in memories:
@@ -152,6 +199,9 @@ async def handle_show_memories() -> None:
 
 def handle_list_prompts() -> None:
     """Handle the --list-prompts command."""
+    from rich.console import Console
+    from rich.table import Table
+
     console = Console()
     table = Table(title="Available Prompt Templates")
     table.add_column("Name", style="cyan")
@@ -163,117 +213,92 @@ def handle_list_prompts() -> None:
         
     console.print(table)
 
-async def load_tools(server_configs: list[McpServerConfig], no_tools: bool, force_refresh: bool) -> tuple[list, list]:
-    """Load and convert MCP tools to LangChain tools."""
-    if no_tools:
-        return [], []
-        
-    toolkits = []
-    langchain_tools = []
-    
-    async def convert_toolkit(server_config: McpServerConfig):
-        toolkit = await convert_mcp_to_langchain_tools(server_config, force_refresh)
-        toolkits.append(toolkit)
-        langchain_tools.extend(toolkit.get_tools())
-
-    async with anyio.create_task_group() as tg:
-        for server_param in server_configs:
-            tg.start_soon(convert_toolkit, server_param)
-            
-    langchain_tools.append(save_memory)
-    return toolkits, langchain_tools
-
-async def handle_conversation(args: argparse.Namespace, query: HumanMessage, 
+async def handle_conversation(args: argparse.Namespace, query: "HumanMessage", 
                             is_conversation_continuation: bool, app_config: AppConfig) -> None:
     """Handle the main conversation flow."""
-    server_configs = [
-        McpServerConfig(
-            server_name=name,
-            server_param=StdioServerParameters(
-                command=config.command,
-                args=config.args or [],
-                env={**(config.env or {}), **os.environ}
-            ),
-            exclude_tools=config.exclude_tools or []
-        )
-        for name, config in app_config.get_enabled_servers().items()
-    ]
-    toolkits, tools = await load_tools(server_configs, args.no_tools, args.force_refresh)
-    
-    extra_body = {}
-    if app_config.llm.base_url and "openrouter" in app_config.llm.base_url:
-        extra_body = {"transforms": ["middle-out"]}
-    # Override model if specified in command line
-    if args.model:
-        app_config.llm.model = args.model
-        
-    model: BaseChatModel = init_chat_model(
-        model=app_config.llm.model,
-        model_provider=app_config.llm.provider,
-        api_key=app_config.llm.api_key,
-        temperature=app_config.llm.temperature,
-        base_url=app_config.llm.base_url,
-        default_headers={
-            "X-Title": "mcp-client-cli",
-            "HTTP-Referer": "https://github.com/adhikasp/mcp-client-cli",
-        },
-        extra_body=extra_body
-    )
+    from .agent import AgentRuntime
 
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", app_config.system_prompt),
-        ("placeholder", "{messages}")
-    ]).partial(today_datetime=datetime.now().isoformat())
+    async with AgentRuntime(app_config, no_tools=args.no_tools, force_refresh=args.force_refresh) as runtime:
+        thread_id = await runtime.get_thread_id(is_conversation_continuation)
+        with timings.phase("conversation turn"):
+            await run_turn(runtime, args, query, thread_id, app_config)
+        runtime.spawn_tools_refresh()
 
-    conversation_manager = ConversationManager(SQLITE_DB)
-    
-    async with AsyncSqliteSaver.from_conn_string(SQLITE_DB) as checkpointer:
-        store = SqliteStore(SQLITE_DB)
-        memories = await get_memories(store)
-        formatted_memories = "\n".join(f"- {memory}" for memory in memories)
-        agent_executor = create_react_agent(
-            model, tools, state_schema=AgentState, 
-            prompt=prompt, checkpointer=checkpointer, store=store
-        )
-        
-        thread_id = (await conversation_manager.get_last_id() if is_conversation_continuation 
-                    else uuid.uuid4().hex)
-
-        input_messages = AgentState(
-            messages=[query], 
-            today_datetime=datetime.now().isoformat(),
-            memories=formatted_memories,
-            remaining_steps=3
-        )
-
-        output = OutputHandler(text_only=args.text_only, only_last_message=args.no_intermediates)
-        output.start()
+async def handle_repl(args: argparse.Namespace, query: "HumanMessage",
+                      is_conversation_continuation: bool, app_config: AppConfig) -> None:
+    """Handle the --repl command, running every turn on the same warm agent runtime."""
+    from langchain_core.messages import HumanMessage
+    from rich.console import Console
+    from .agent import AgentRuntime
+
+    console = Console()
+    async with AgentRuntime(app_config, no_tools=args.no_tools, force_refresh=args.force_refresh) as runtime:
+        runtime.start_idle_reaper()
+        thread_id = await runtime.get_thread_id(is_conversation_continuation)
+        if query.content:
+            await run_turn(runtime, args, query, thread_id, app_config)
+        runtime.schedule_tools_refresh()
+
+        console.print("Type your message, or 'exit' to quit.", style="dim")
+        while True:
+            try:
+                text = (await read_line(console, "[bold cyan]> [/]")).strip()
+            except EOFError:
+                break
+            if text in ("exit", "quit"):
+                break
+            if text:
+                await run_turn(runtime, args, HumanMessage(content=text), thread_id, app_config)
+                runtime.schedule_tools_refresh()
+
+async def read_line(console, prompt: str) -> str:
+    """Read a line of input without blocking the event loop.
+
+    The read runs in a daemon thread, so background work such as idle server eviction keeps
+    running while waiting, and an interrupted prompt does not keep the process alive.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def read():
         try:
-            async for chunk in agent_executor.astream(
-                input_messages,
-                stream_mode=["messages", "values"],
-                config={"configurable": {"thread_id": thread_id, "user_id": "myself"}, 
-                       "recursion_limit": 100}
-            ):
+            line = console.input(prompt)
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(line))
+        except Exception as e:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_exception(e))
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+async def run_turn(runtime, args: argparse.Namespace, query: "HumanMessage",
+                   thread_id: str, app_config: AppConfig) -> None:
+    """Run one query on the runtime and render the streamed response."""
+    from .output import OutputHandler
+
+    output = OutputHandler(text_only=args.text_only, only_last_message=args.no_intermediates)
+    output.start()
+    try:
+        async with aclosing(runtime.astream(query, thread_id, model=args.model,
+                                               tool_cache=not args.no_tool_cache)) as stream:
+            async for chunk in stream:
                 output.update(chunk)
                 if not args.no_confirmations:
                     if not output.confirm_tool_call(app_config.__dict__, chunk):
                         break
-        except Exception as e:
-            output.update_error(e)
-        finally:
-            output.finish()
+    except Exception as e:
+        output.update_error(e)
+    finally:
+        output.finish()
 
-        await conversation_manager.save_id(thread_id, checkpointer.conn)
+    await runtime.save_thread_id(thread_id)
 
-    for toolkit in toolkits:
-        await toolkit.close()
-
-def parse_query(args: argparse.Namespace) -> tuple[HumanMessage, bool]:
+def parse_query(args: argparse.Namespace) -> tuple["HumanMessage", bool]:
     """
     Parse the query from command line arguments.
     Returns a tuple of (HumanMessage, is_conversation_continuation).
     """
+    from langchain_core.messages import HumanMessage
+
     query_parts = ' '.join(args.query).split()
     stdin_content = ""
     stdin_image = None
@@ -340,7 +365,7 @@ def parse_query(args: argparse.Namespace) -> tuple[HumanMessage, bool]:
     elif stdin_content:
         query_text = stdin_content
     elif not query_text and not stdin_image:
-        return HumanMessage(content=""), False
+        return HumanMessage(content=""), is_continuation
 
     # Create the message content
     if stdin_image:
@@ -1,12 +1,88 @@
 """Configuration management for the MCP client CLI."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+import json
+import marshal
 import os
-import commentjson
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
-from .const import CONFIG_FILE, CONFIG_DIR
+from .const import CONFIG_FILE, CONFIG_DIR, CONFIG_CACHE_FILE, SERVER_IDLE_TIMEOUT, BYTES_PER_TOKEN, HEDGE_PERCENTILE
+
+def _read_config_cache() -> Dict[str, Any]:
+    try:
+        with open(CONFIG_CACHE_FILE, 'rb') as f:
+            cache = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+def _write_config_cache(cache: Dict[str, Any]) -> None:
+    tmp_path = CONFIG_CACHE_FILE.with_name(f"{CONFIG_CACHE_FILE.name}.{os.getpid()}.tmp")
+    try:
+        CONFIG_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        # The config holds API keys and server credentials, so the cache is private to the user
+        tmp_path.unlink(missing_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(cache, f)
+        os.replace(tmp_path, CONFIG_CACHE_FILE)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+def parse_config_file(path: str | Path) -> dict:
+    """Parse a config file, reusing the cached result while the file is unchanged.
+
+    The parsed JSON is cached in marshal format, keyed by the absolute path and invalidated
+    when the file's mtime or size changes. Only the file contents are cached, so values
+    resolved from the environment are never written to the cache. The cache file holds any
+    secrets written in the config file, so it is only readable by its owner.
+
+    Args:
+        path (str | Path): The config file to parse.
+
+    Returns:
+        dict: The parsed configuration.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = [stat.st_mtime_ns, stat.st_size, marshal.version]
+
+    cache = _read_config_cache()
+    entry = cache.get(path)
+    if entry and entry[0] == key:
+        return entry[1]
+
+    with open(path, 'r') as f:
+        text = f.read()
+    try:
+        config = json.loads(text)
+    except ValueError:
+        # Comments need the much slower commentjson parser
+        import commentjson
+        config = commentjson.loads(text)
+
+    cache[path] = [key, config]
+    _write_config_cache(cache)
+    return config
+
+def parse_output_budget(value: int | str | None) -> Optional[int]:
+    """Convert an output budget to bytes.
+
+    Args:
+        value (int | str | None): A number of bytes, or a string such as "2000 tokens".
+
+    Returns:
+        Optional[int]: The budget in bytes, None for no budget.
+    """
+    if value is None or isinstance(value, int):
+        return value or None
+    amount, _, unit = value.strip().partition(" ")
+    if unit.strip() in ("token", "tokens"):
+        return int(amount) * BYTES_PER_TOKEN
+    if unit.strip() in ("", "byte", "bytes"):
+        return int(amount)
+    raise ValueError(f"Invalid output budget {value!r}, expected bytes or a string like '2000 tokens'")
 
 @dataclass
 class LLMConfig:
@@ -30,24 +106,71 @@ class LLMConfig:
 
 @dataclass
 class ServerConfig:
-    """Configuration for an MCP server."""
-    command: str
+    """Configuration for an MCP server, either a local command or a remote URL."""
+    command: Optional[str] = None
     args: List[str] = None
     env: Dict[str, str] = None
+    url: Optional[str] = None
+    transport: str = "streamable_http"
+    headers: Dict[str, str] = None
     enabled: bool = True
     exclude_tools: List[str] = None
     requires_confirmation: List[str] = None
+    idle_timeout: Optional[float] = SERVER_IDLE_TIMEOUT
+    max_concurrency: Optional[int] = None
+    cacheable_tools: Dict[str, float] = None
+    output_budget: Optional[int] = None
+    tool_output_budgets: Dict[str, int] = None
+    timeout: Optional[float] = None
+    tool_timeouts: Dict[str, float] = None
+    hedged_tools: List[str] = None
+    hedge_percentile: float = HEDGE_PERCENTILE
 
     @classmethod
     def from_dict(cls, config: dict) -> "ServerConfig":
         """Create ServerConfig from dictionary."""
+        if not config.get("command") and not config.get("url"):
+            raise ValueError("An MCP server needs either a command or a url")
+        if config.get("transport", "streamable_http") not in ("streamable_http", "sse"):
+            raise ValueError(f"Unknown MCP transport {config['transport']!r}, expected 'streamable_http' or 'sse'")
         return cls(
-            command=config["command"],
+            command=config.get("command"),
             args=config.get("args", []),
             env=config.get("env", {}),
+            url=config.get("url"),
+            transport=config.get("transport", "streamable_http"),
+            headers=config.get("headers", {}),
             enabled=config.get("enabled", True),
             exclude_tools=config.get("exclude_tools", []),
-            requires_confirmation=config.get("requires_confirmation", [])
+            requires_confirmation=config.get("requires_confirmation", []),
+            idle_timeout=config.get("idle_timeout", SERVER_IDLE_TIMEOUT),
+            max_concurrency=config.get("max_concurrency"),
+            cacheable_tools=config.get("cacheable_tools", {}),
+            output_budget=parse_output_budget(config.get("output_budget")),
+            tool_output_budgets={
+                tool: parse_output_budget(budget)
+                for tool, budget in config.get("tool_output_budgets", {}).items()
+            },
+            timeout=config.get("timeout"),
+            tool_timeouts=config.get("tool_timeouts", {}),
+            hedged_tools=config.get("hedged_tools", []),
+            hedge_percentile=config.get("hedge_percentile", HEDGE_PERCENTILE)
+        )
+
+@dataclass
+class ToolSelectionConfig:
+    """Configuration for binding only the tools relevant to each query."""
+    top_k: Optional[int] = None
+    pinned_tools: List[str] = None
+    embedding_model: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "ToolSelectionConfig":
+        """Create ToolSelectionConfig from dictionary."""
+        return cls(
+            top_k=config.get("top_k"),
+            pinned_tools=config.get("pinned_tools", []),
+            embedding_model=config.get("embedding_model"),
         )
 
 @dataclass
@@ -57,6 +180,9 @@ class AppConfig:
     system_prompt: str
     mcp_servers: Dict[str, ServerConfig]
     tools_requires_confirmation: List[str]
+    tool_selection: ToolSelectionConfig = field(default_factory=ToolSelectionConfig)
+    # Absolute path, mtime and size of the file the configuration was loaded from
+    source: Optional[List[Any]] = None
 
     @classmethod
     def load(cls) -> "AppConfig":
@@ -67,8 +193,8 @@ class AppConfig:
         if chosen_path is None:
             raise FileNotFoundError(f"Could not find config file in any of: {', '.join(map(str, config_paths))}")
 
-        with open(chosen_path, 'r') as f:
-            config = commentjson.load(f)
+        config = parse_config_file(chosen_path)
+        stat = os.stat(chosen_path)
 
         # Extract tools requiring confirmation
         tools_requires_confirmation = []
@@ -82,7 +208,9 @@ class AppConfig:
                 name: ServerConfig.from_dict(server_config)
                 for name, server_config in config["mcpServers"].items()
             },
-            tools_requires_confirmation=tools_requires_confirmation
+            tools_requires_confirmation=tools_requires_confirmation,
+            tool_selection=ToolSelectionConfig.from_dict(config.get("toolSelection", {})),
+            source=[os.path.abspath(chosen_path), stat.st_mtime_ns, stat.st_size],
         )
 
     def get_enabled_servers(self) -> Dict[str, ServerConfig]:
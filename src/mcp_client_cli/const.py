@@ -5,4 +5,68 @@ DEFAULT_QUERY = "Summarize https://www.youtube.com/watch?v=NExtKbS1Ljc"
 CONFIG_FILE = 'mcp-server-config.json'
 CONFIG_DIR = Path.home() / ".llm"
 SQLITE_DB = CONFIG_DIR / "conversations.db"
-CACHE_DIR = CONFIG_DIR / "mcp-tools"
\ No newline at end of file
+CACHE_DIR = CONFIG_DIR / "mcp-tools"
+TOOLS_CACHE_DB = CACHE_DIR / "tools.db"
+# Tool outputs over their budget are saved here for the model to page through
+TOOL_OUTPUT_DIR = CONFIG_DIR / "tool-output"
+TOOL_OUTPUT_RETENTION_HOURS = 24 * 7
+# Largest page of a saved tool output returned at once
+TOOL_OUTPUT_PAGE_BYTES = 32 * 1024
+# Bytes assumed per token when an output budget is given in tokens
+BYTES_PER_TOKEN = 4
+# Size the tool result cache is trimmed to, least recently used results first
+TOOL_RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Model providers whose APIs accept images in tool results. Others, such as the OpenAI Chat
+# Completions API, only accept text there
+TOOL_RESULT_IMAGE_PROVIDERS = {"anthropic"}
+USAGE_FILE = CONFIG_DIR / "server-usage.json"
+# Parsed configuration files, keyed by path, mtime and size
+CONFIG_CACHE_FILE = CONFIG_DIR / "config-cache.bin"
+# Weight kept by the previous usage score when a run is recorded
+USAGE_SCORE_DECAY = 0.8
+# Seconds a long-lived session (REPL, daemon) keeps an idle server running
+SERVER_IDLE_TIMEOUT = 300
+# Hedged tool calls start a second request once the first is slower than this percentile
+HEDGE_PERCENTILE = 95
+# Latencies kept per tool, and needed before hedging starts
+HEDGE_WINDOW = 100
+HEDGE_MIN_SAMPLES = 10
+# Delay before respawning a crashed server, doubled after every further crash up to the max
+RESPAWN_BACKOFF_BASE = 0.5
+RESPAWN_BACKOFF_MAX = 30
+# Seconds a server gets to start and list its tools, so a hung server cannot stall tool loading
+TOOLS_LIST_TIMEOUT = 120
+# Seconds an idle HTTP connection to a remote server is kept open for reuse
+HTTP_KEEPALIVE_EXPIRY = 120
+# Milliseconds the memory store waits on a locked database before failing
+STORE_BUSY_TIMEOUT_MS = 5000
+# Prepared statements the memory store keeps per connection
+STORE_STATEMENT_CACHE_SIZE = 256
+# Vectors rewritten per statement when converting vectors stored as JSON text, or assigning
+# vectors to the lists of the approximate search index
+VECTOR_REWRITE_BATCH_SIZE = 500
+# The approximate search index is trained once the store holds this many vectors; below
+# that, exact search is fast enough
+ANN_MIN_VECTORS = 10000
+# The index is trained again once the store holds this many times the vectors it was trained on
+ANN_RETRAIN_GROWTH = 4
+# Training vectors sampled per list of the index
+ANN_TRAIN_VECTORS_PER_LIST = 64
+# Lists of the index searched per query, trading recall for latency
+ANN_PROBES = 16
+# Tool descriptions are cut to this many characters before being bound to the model
+MAX_TOOL_DESCRIPTION_LENGTH = 1024
+# Bumped when schema compaction changes, so cached tools compacted differently are refreshed
+SCHEMA_COMPACTION_VERSION = 1
+# Most tools listed by one call to the find_tools tool
+FIND_TOOLS_LIMIT = 10
+# Seconds all servers get to exit at shutdown, together, before they are sent SIGTERM
+SHUTDOWN_TIMEOUT = 1.0
+# Seconds a server gets to exit after SIGTERM before it is sent SIGKILL
+SHUTDOWN_KILL_GRACE = 0.5
+# Servers whose usage score is below this are not pre-warmed
+PREWARM_MIN_SCORE = 0.2
+DAEMON_SOCKET = CONFIG_DIR / "daemon.sock"
+# Longest line of the daemon protocol, in bytes. A chunk carries a whole message, with its
+# tool results and images
+DAEMON_LINE_LIMIT = 256 * 1024 * 1024
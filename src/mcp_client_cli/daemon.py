@@ -0,0 +1,200 @@
+"""Background agent daemon and the thin client that talks to it.
+
+`llm --daemon` keeps an `AgentRuntime` warm and serves queries over a Unix socket. Plain
+`llm` invocations forward their query to the daemon when its socket is present, and render
+the chunks it streams back, so they skip tool loading, model setup and graph compilation.
+
+The protocol is newline-delimited JSON. The client sends one request, carrying the source
+of its configuration. The daemon answers `config_mismatch` when it was started from another
+or since changed configuration file, and the client then runs the query in-process.
+Otherwise it answers `accepted`, then `chunk` events followed by `done` or `error`. When the client asked for confirmations,
+the daemon waits for a `{"continue": bool}` reply after every chunk carrying tool calls.
+"""
+
+import argparse
+import asyncio
+from contextlib import aclosing
+import json
+import os
+import signal
+import sys
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, message_to_dict, messages_from_dict
+
+from .config import AppConfig
+from .const import DAEMON_LINE_LIMIT, DAEMON_SOCKET
+from .output import OutputHandler
+
+
+def _encode_chunk(chunk: tuple) -> dict:
+    """Encode a `messages` or `values` stream chunk as a JSON event.
+
+    Only the last message of a `values` chunk is sent, as that is all the output handler renders.
+    """
+    mode, data = chunk
+    message = data[0] if mode == "messages" else data["messages"][-1]
+    return {"type": "chunk", "mode": mode, "message": message_to_dict(message)}
+
+
+def _decode_chunk(event: dict) -> tuple:
+    """Rebuild the stream chunk encoded by `_encode_chunk`."""
+    message = messages_from_dict([event["message"]])[0]
+    if event["mode"] == "messages":
+        return ("messages", (message, {}))
+    return ("values", {"messages": [message]})
+
+
+def _has_tool_calls(message: BaseMessage) -> bool:
+    return isinstance(message, AIMessage) and bool(message.tool_calls)
+
+
+async def _send(writer: asyncio.StreamWriter, event: dict) -> None:
+    writer.write(json.dumps(event, default=str).encode() + b"\n")
+    await writer.drain()
+
+
+class AgentDaemon:
+    """Serve queries from a warm `AgentRuntime` over a Unix socket.
+
+    Args:
+        app_config (AppConfig): The loaded application configuration
+        force_refresh (bool): Force refresh of the tools cache on startup
+    """
+
+    def __init__(self, app_config: AppConfig, force_refresh: bool = False):
+        self.app_config = app_config
+        self.force_refresh = force_refresh
+        self.runtime = None
+
+    async def serve(self) -> None:
+        """Start the runtime and serve requests until interrupted."""
+        if not hasattr(asyncio, "start_unix_server"):
+            raise SystemExit("Daemon mode requires Unix domain sockets, which this platform does not support")
+
+        from .agent import AgentRuntime
+
+        async with AgentRuntime(self.app_config, force_refresh=self.force_refresh) as runtime:
+            self.runtime = runtime
+            runtime.start_idle_reaper()
+            runtime.schedule_tools_refresh()
+            server = await self._start_server()
+
+            main_task = asyncio.current_task()
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGTERM, main_task.cancel)
+            print(f"llm daemon listening on {DAEMON_SOCKET}", file=sys.stderr)
+            try:
+                async with server:
+                    await server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+            finally:
+                loop.remove_signal_handler(signal.SIGTERM)
+                DAEMON_SOCKET.unlink(missing_ok=True)
+
+    async def _start_server(self) -> asyncio.Server:
+        """Create the socket, accessible to the current user only, and listen on it."""
+        DAEMON_SOCKET.parent.mkdir(parents=True, exist_ok=True)
+        DAEMON_SOCKET.unlink(missing_ok=True)
+        # The socket is created private, other users cannot connect before the chmod
+        umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(
+                self._handle_client, path=str(DAEMON_SOCKET), limit=DAEMON_LINE_LIMIT
+            )
+        finally:
+            os.umask(umask)
+        os.chmod(DAEMON_SOCKET, 0o600)
+        return server
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Run one query and stream its chunks back to the client."""
+        try:
+            request = json.loads(await reader.readline())
+            if request.get("config") != self.app_config.source:
+                await _send(writer, {"type": "config_mismatch"})
+                return
+            await _send(writer, {"type": "accepted"})
+            query = messages_from_dict([request["query"]])[0]
+            thread_id = await self.runtime.get_thread_id(request["continuation"])
+            stream = self.runtime.astream(
+                query, thread_id, model=request.get("model"), no_tools=request.get("no_tools", False),
+                tool_cache=not request.get("no_tool_cache", False)
+            )
+            async with aclosing(stream):
+                async for chunk in stream:
+                    await _send(writer, _encode_chunk(chunk))
+                    if request["confirm"] and chunk[0] == "values" and _has_tool_calls(chunk[1]["messages"][-1]):
+                        reply = await reader.readline()
+                        if not reply or not json.loads(reply).get("continue"):
+                            break
+            await self.runtime.save_thread_id(thread_id)
+            await _send(writer, {"type": "done"})
+            self.runtime.schedule_tools_refresh()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            try:
+                await _send(writer, {"type": "error", "error": f"{type(e).__name__}: {e}"})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+
+async def run_client(args: argparse.Namespace, query: HumanMessage,
+                     is_conversation_continuation: bool, app_config: AppConfig) -> bool:
+    """Send the query to a running daemon and render its response.
+
+    Returns:
+        bool: False if no daemon is reachable, or it runs another configuration, and the
+            query should run in-process.
+    """
+    if not DAEMON_SOCKET.exists():
+        return False
+    try:
+        reader, writer = await asyncio.open_unix_connection(str(DAEMON_SOCKET), limit=DAEMON_LINE_LIMIT)
+    except (OSError, AttributeError):
+        return False
+
+    await _send(writer, {
+        "query": message_to_dict(query),
+        "continuation": is_conversation_continuation,
+        "model": args.model,
+        "no_tools": args.no_tools,
+        "no_tool_cache": args.no_tool_cache,
+        "confirm": not args.no_confirmations,
+        "config": app_config.source,
+    })
+    try:
+        reply = json.loads(await reader.readline() or "{}")
+    except (ConnectionError, ValueError):
+        reply = {}
+    if reply.get("type") != "accepted":
+        writer.close()
+        return False
+
+    output = OutputHandler(text_only=args.text_only, only_last_message=args.no_intermediates)
+    output.start()
+    try:
+        while line := await reader.readline():
+            event = json.loads(line)
+            if event["type"] == "done":
+                break
+            if event["type"] == "error":
+                raise RuntimeError(event["error"])
+            chunk = _decode_chunk(event)
+            output.update(chunk)
+            if not args.no_confirmations and chunk[0] == "values" and _has_tool_calls(chunk[1]["messages"][-1]):
+                confirmed = output.confirm_tool_call(app_config.__dict__, chunk)
+                await _send(writer, {"continue": confirmed})
+                if not confirmed:
+                    break
+        else:
+            raise ConnectionError("llm daemon closed the connection")
+    except Exception as e:
+        output.update_error(e)
+    finally:
+        output.finish()
+        writer.close()
+    return True
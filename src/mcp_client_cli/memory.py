@@ -4,20 +4,20 @@ This store provides persistent storage using SQLite with optional vector search
 It implements the BaseStore interface from langgraph.
 """
 
+import asyncio
+from collections import Counter
 from datetime import datetime, timezone
+from functools import cache
+import heapq
 import json
 import logging
+import math
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
-from typing_extensions import Annotated
-import uuid
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import aiosqlite
 from langchain_core.embeddings import Embeddings
-from langgraph.prebuilt import InjectedStore
-from langgraph.store.base import BaseStore
-from langchain_core.runnables import RunnableConfig
-from langchain_core.tools import tool
 
 from langgraph.store.base import (
     BaseStore,
@@ -36,18 +36,77 @@ from langgraph.store.base import (
     tokenize_path,
 )
 
+from .const import (
+    ANN_MIN_VECTORS,
+    ANN_PROBES,
+    ANN_RETRAIN_GROWTH,
+    ANN_TRAIN_VECTORS_PER_LIST,
+    STORE_BUSY_TIMEOUT_MS,
+    STORE_STATEMENT_CACHE_SIZE,
+    VECTOR_REWRITE_BATCH_SIZE,
+)
+
 logger = logging.getLogger(__name__)
-        
 
-@tool
-async def save_memory(memories: List[str], *, config: RunnableConfig, store: Annotated[BaseStore, InjectedStore()]) -> str:
-    '''Save the given memory for the current user. Do not save duplicate memories.'''
-    user_id = config.get("configurable", {}).get("user_id")
-    namespace = ("memories", user_id)
-    for memory in memories:
-        id = uuid.uuid4().hex
-        await store.aput(namespace, f"memory_{id}", {"data": memory})
-    return f"Saved memories: {memories}"
+# A stored vector is a header, holding a format tag and the number of dimensions, followed
+# by the packed little-endian components
+_VECTOR_HEADER = struct.Struct("<4sI")
+# Format name: (tag, struct and NumPy type code)
+_VECTOR_FORMATS = {"float32": (b"VF32", "f4"), "float16": (b"VF16", "f2")}
+_VECTOR_CODES = {tag: code for tag, code in _VECTOR_FORMATS.values()}
+_STRUCT_CODES = {"f4": "f", "f2": "e"}
+
+
+@cache
+def _numpy():
+    """Return the NumPy module, or None when it is not installed."""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def encode_vector(vector: List[float], dtype: str = "float32") -> bytes:
+    """Pack a vector into the stored binary format.
+
+    Args:
+        vector (List[float]): The vector
+        dtype (str): "float32", or "float16" for half the size at reduced precision
+
+    Returns:
+        bytes: The header followed by the packed components
+    """
+    tag, code = _VECTOR_FORMATS[dtype]
+    np = _numpy()
+    if np is not None:
+        body = np.asarray(vector, dtype=f"<{code}").tobytes()
+    else:
+        body = struct.pack(f"<{len(vector)}{_STRUCT_CODES[code]}", *vector)
+    return _VECTOR_HEADER.pack(tag, len(vector)) + body
+
+
+def decode_vector(data: Union[bytes, str]) -> Any:
+    """Unpack a stored vector.
+
+    With NumPy installed, the vector is a read-only array over the stored bytes, without
+    copying them. Vectors stored as JSON text by earlier versions are decoded as well.
+
+    Args:
+        data (Union[bytes, str]): The stored vector
+
+    Returns:
+        Any: The vector, as a NumPy array or a list of floats
+    """
+    if isinstance(data, str):
+        return json.loads(data)
+    tag, dims = _VECTOR_HEADER.unpack_from(data)
+    code = _VECTOR_CODES[tag]
+    np = _numpy()
+    if np is not None:
+        return np.frombuffer(data, dtype=f"<{code}", count=dims, offset=_VECTOR_HEADER.size)
+    return list(struct.unpack_from(f"<{dims}{_STRUCT_CODES[code]}", data, _VECTOR_HEADER.size))
+        
 
 async def get_memories(store: BaseStore, user_id: str = "myself", query: str = None) -> List[str]:
     namespace = ("memories", user_id)
@@ -62,14 +121,38 @@ class SqliteStore(BaseStore):
     - items: Stores the actual key-value pairs with their metadata
     - vectors: Stores vector embeddings for semantic search
 
+    The store keeps one connection open, in WAL mode, from its first operation until
+    `aclose()`, and runs batches on it one at a time.
+
+    With `ann_index`, searches over large stores are approximate: once the store holds
+    `ANN_MIN_VECTORS` vectors, they are clustered into an IVF index (see `vector_index`),
+    kept in the same database, and a search only scores the vectors of the `ann_probes`
+    lists nearest the query. When too few of those vectors match the namespace and filter
+    of a search, it is answered exactly.
+
     Args:
         db_path (Union[str, Path]): Path to the SQLite database file
         index (Optional[IndexConfig]): Configuration for vector search functionality
+        vector_dtype (str): Storage format of vectors, "float32" or "float16"
+        ann_index (bool): Search with an approximate nearest-neighbour index. Requires NumPy
+        ann_probes (int): Lists of the approximate index searched per query
     """
 
     def __init__(
-        self, db_path: Union[str, Path], *, index: Optional[IndexConfig] = None
+        self, db_path: Union[str, Path], *, index: Optional[IndexConfig] = None,
+        vector_dtype: str = "float32", ann_index: bool = False, ann_probes: int = ANN_PROBES
     ) -> None:
+        if vector_dtype not in _VECTOR_FORMATS:
+            raise ValueError(f"Unknown vector_dtype {vector_dtype!r}, expected one of {list(_VECTOR_FORMATS)}")
+        self.vector_dtype = vector_dtype
+        if ann_index and _numpy() is None:
+            logger.warning("NumPy not found, memory search stays exact. Install NumPy to use ann_index.")
+            ann_index = False
+        self.ann_index = bool(ann_index and index)
+        self.ann_probes = ann_probes
+        # Centroids of the index lists, and the generation of the index they belong to
+        self._centroids = None
+        self._ann_generation: Optional[int] = None
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self.index_config = index
@@ -85,6 +168,31 @@ class SqliteStore(BaseStore):
         else:
             self.index_config = None
             self.embeddings = None
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Return the store's connection, opening it and setting up the schema on first use.
+
+        Must be called with `_lock` held.
+        """
+        if self._db is None:
+            db = await aiosqlite.connect(self.db_path, cached_statements=STORE_STATEMENT_CACHE_SIZE)
+            await db.execute("PRAGMA journal_mode=WAL")
+            # Wait for the checkpointer's writes instead of failing with "database is locked"
+            await db.execute(f"PRAGMA busy_timeout={STORE_BUSY_TIMEOUT_MS}")
+            # In WAL mode, NORMAL only risks the last transactions on power loss, not corruption
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await self._init_db(db)
+            self._db = db
+        return self._db
+
+    async def aclose(self) -> None:
+        """Close the store's connection. The next operation opens a new one."""
+        async with self._lock:
+            if self._db is not None:
+                await self._db.close()
+                self._db = None
 
     async def _init_db(self, db: aiosqlite.Connection) -> None:
         """Initialize database schema.
@@ -109,13 +217,178 @@ class SqliteStore(BaseStore):
                     key TEXT,
                     path TEXT,
                     vector BLOB,
+                    list_id INTEGER,
                     PRIMARY KEY (namespace, key, path),
                     FOREIGN KEY (namespace, key) REFERENCES items (namespace, key)
                         ON DELETE CASCADE
                 )
             """)
+            async with db.execute("PRAGMA table_info(vectors)") as cursor:
+                columns = [row[1] async for row in cursor]
+            if "list_id" not in columns:
+                await db.execute("ALTER TABLE vectors ADD COLUMN list_id INTEGER")
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            async with db.execute("SELECT value FROM store_meta WHERE key = 'vector_format'") as cursor:
+                migrated = await cursor.fetchone() is not None
+            # The scan for JSON vectors runs once per database, not on every connection
+            if not migrated:
+                await self._migrate_json_vectors(db)
+                await db.execute("INSERT INTO store_meta (key, value) VALUES ('vector_format', 'binary')")
+        if self.ann_index:
+            await db.execute("CREATE INDEX IF NOT EXISTS vectors_list_id ON vectors (list_id)")
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS vector_index (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    generation INTEGER,
+                    trained_count INTEGER,
+                    lists INTEGER,
+                    centroids BLOB
+                )
+            """)
         await db.commit()
 
+    async def _migrate_json_vectors(self, db: aiosqlite.Connection) -> None:
+        """Convert vectors stored as JSON text by earlier versions to the binary format.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+        """
+        last_rowid = 0
+        while True:
+            async with db.execute(
+                """
+                SELECT rowid, vector FROM vectors
+                WHERE typeof(vector) = 'text' AND rowid > ?
+                ORDER BY rowid LIMIT ?
+                """,
+                (last_rowid, VECTOR_REWRITE_BATCH_SIZE),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                return
+            await db.executemany(
+                "UPDATE vectors SET vector = ? WHERE rowid = ?",
+                [(encode_vector(json.loads(vector), self.vector_dtype), rowid) for rowid, vector in rows],
+            )
+            last_rowid = rows[-1][0]
+
+    async def _sync_vector_index(self, db: aiosqlite.Connection) -> None:
+        """Load the centroids of the approximate index, when another store trained it again.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+        """
+        async with db.execute("SELECT generation FROM vector_index") as cursor:
+            row = await cursor.fetchone()
+        generation = row[0] if row else None
+        if generation == self._ann_generation:
+            return
+        self._centroids = None
+        if generation is not None:
+            async with db.execute("SELECT lists, centroids FROM vector_index") as cursor:
+                lists, centroids = await cursor.fetchone()
+            self._centroids = decode_vector(centroids).reshape(lists, -1)
+            # Vectors written by stores without the index have no list yet
+            await self._assign_lists(db, only_unlisted=True)
+        self._ann_generation = generation
+
+    async def _train_vector_index(self, db: aiosqlite.Connection) -> None:
+        """Train the approximate index once the store holds enough vectors for it.
+
+        The index is trained on a sample of the vectors, and trained again as the store
+        grows, after which every vector is assigned to a list of the new centroids. Only
+        vectors of the index's dimension, that of `index["dims"]` or else the most common
+        one, are indexed; others, from another embedding model, are only found by exact search.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+        """
+        from . import vector_index
+
+        # Cheaper than counting, and only over-counts deleted vectors
+        async with db.execute("SELECT max(rowid) FROM vectors") as cursor:
+            (count,) = await cursor.fetchone()
+        count = count or 0
+        async with db.execute("SELECT trained_count FROM vector_index") as cursor:
+            row = await cursor.fetchone()
+        if count < ANN_MIN_VECTORS or (row and count < row[0] * ANN_RETRAIN_GROWTH):
+            return
+
+        lists = vector_index.list_count(count)
+        async with db.execute(
+            "SELECT vector FROM vectors ORDER BY random() LIMIT ?",
+            (lists * ANN_TRAIN_VECTORS_PER_LIST,),
+        ) as cursor:
+            sample = [decode_vector(vector) async for (vector,) in cursor]
+        dims = self.index_config.get("dims") or Counter(len(vector) for vector in sample).most_common(1)[0][0]
+        sample = [vector for vector in sample if len(vector) == dims]
+        if not sample:
+            logger.warning(f"No stored vectors have {dims} dimensions, the memory search index is not trained")
+            return
+        centroids = await asyncio.to_thread(vector_index.train_centroids, _numpy().vstack(sample), lists)
+
+        generation = (self._ann_generation or 0) + 1
+        await db.execute(
+            """
+            INSERT INTO vector_index (id, generation, trained_count, lists, centroids)
+            VALUES (0, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                generation = excluded.generation,
+                trained_count = excluded.trained_count,
+                lists = excluded.lists,
+                centroids = excluded.centroids
+            """,
+            (generation, count, len(centroids), encode_vector(centroids.ravel())),
+        )
+        self._centroids, self._ann_generation = centroids, generation
+        await self._assign_lists(db, only_unlisted=False)
+
+    async def _assign_lists(self, db: aiosqlite.Connection, only_unlisted: bool) -> None:
+        """Assign stored vectors to the lists of the approximate index.
+
+        Vectors of another dimension than the centroids are left without a list, so they are
+        only found by exact search.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+            only_unlisted (bool): Only assign the vectors without a list
+        """
+        from . import vector_index
+
+        condition = "list_id IS NULL AND " if only_unlisted else ""
+        dims = self._centroids.shape[1]
+        last_rowid, skipped = 0, 0
+        while True:
+            async with db.execute(
+                f"SELECT rowid, vector FROM vectors WHERE {condition}rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, VECTOR_REWRITE_BATCH_SIZE),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                if skipped:
+                    logger.warning(
+                        f"{skipped} stored vectors do not have the {dims} dimensions of the memory "
+                        "search index, they are only found by exact search"
+                    )
+                return
+            vectors = [(rowid, decode_vector(vector)) for rowid, vector in rows]
+            indexed = [(rowid, vector) for rowid, vector in vectors if len(vector) == dims]
+            skipped += len(vectors) - len(indexed)
+            assignments = []
+            if indexed:
+                lists = vector_index.assign(_numpy().vstack([vector for _, vector in indexed]), self._centroids)
+                assignments = list(zip(lists.tolist(), [rowid for rowid, _ in indexed]))
+            if not only_unlisted:
+                # Clear lists of an earlier index for the vectors this one cannot hold
+                assignments += [(None, rowid) for rowid, vector in vectors if len(vector) != dims]
+            await db.executemany("UPDATE vectors SET list_id = ? WHERE rowid = ?", assignments)
+            last_rowid = rows[-1][0]
+
     def batch(self, ops: List[Op]) -> List[Result]:
         """Execute a batch of operations synchronously.
 
@@ -136,40 +409,55 @@ class SqliteStore(BaseStore):
         Returns:
             List[Result]: Results of the operations
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await self._init_db(db)
-            results: List[Result] = []
-            put_ops: Dict[Tuple[Tuple[str, ...], str], PutOp] = {}
-            search_ops: Dict[int, Tuple[SearchOp, List[Tuple[Item, List[List[float]]]]]] = {}
-
-            for i, op in enumerate(ops):
-                if isinstance(op, GetOp):
-                    item = await self._get_item(db, op.namespace, op.key)
-                    results.append(item)
-                elif isinstance(op, SearchOp):
-                    candidates = await self._filter_items(db, op)
-                    search_ops[i] = (op, candidates)
-                    results.append(None)
-                elif isinstance(op, ListNamespacesOp):
-                    namespaces = await self._list_namespaces(db, op)
-                    results.append(namespaces)
-                elif isinstance(op, PutOp):
-                    put_ops[(op.namespace, op.key)] = op
-                    results.append(None)
-                else:
-                    raise ValueError(f"Unknown operation type: {type(op)}")
+        put_ops: Dict[Tuple[Tuple[str, ...], str], PutOp] = {}
+        search_ops: Dict[int, Tuple[SearchOp, List[Tuple[Item, List[List[float]]]]]] = {}
+        for i, op in enumerate(ops):
+            if isinstance(op, PutOp):
+                put_ops[(op.namespace, op.key)] = op
+            elif isinstance(op, SearchOp):
+                search_ops[i] = (op, [])
+            elif not isinstance(op, (GetOp, ListNamespacesOp)):
+                raise ValueError(f"Unknown operation type: {type(op)}")
+
+        # Embeddings are computed before taking the connection, so other batches can run meanwhile
+        query_vectors = await self._embed_search_queries(search_ops) if search_ops else {}
+        to_embed = self._extract_texts(put_ops)
+        embeddings = None
+        if to_embed and self.index_config and self.embeddings:
+            embeddings = await self.embeddings.aembed_documents(list(to_embed))
+
+        async with self._lock:
+            db = await self._connect()
+            try:
+                if self.ann_index:
+                    await self._sync_vector_index(db)
+                results: List[Result] = []
+                for i, op in enumerate(ops):
+                    if isinstance(op, GetOp):
+                        results.append(await self._get_item(db, op.namespace, op.key))
+                    elif isinstance(op, SearchOp):
+                        search_ops[i] = (op, await self._filter_items(db, op, query_vectors.get(op.query)))
+                        results.append(None)
+                    elif isinstance(op, ListNamespacesOp):
+                        results.append(await self._list_namespaces(db, op))
+                    else:
+                        results.append(None)
 
-            if search_ops:
-                query_vectors = await self._embed_search_queries(search_ops)
-                await self._batch_search(db, search_ops, query_vectors, results)
+                if search_ops:
+                    await self._batch_search(db, search_ops, query_vectors, results)
 
-            to_embed = self._extract_texts(put_ops)
-            if to_embed and self.index_config and self.embeddings:
-                embeddings = await self.embeddings.aembed_documents(list(to_embed))
-                await self._insert_vectors(db, to_embed, embeddings)
+                if embeddings is not None:
+                    await self._insert_vectors(db, to_embed, embeddings)
 
-            await self._apply_put_ops(db, put_ops)
-            await db.commit()
+                await self._apply_put_ops(db, put_ops)
+                if self.ann_index and embeddings is not None:
+                    await self._train_vector_index(db)
+                await db.commit()
+            except BaseException:
+                await db.rollback()
+                # The index may have been trained in the rolled back transaction
+                self._centroids, self._ann_generation = None, None
+                raise
 
             return results
 
@@ -202,66 +490,241 @@ class SqliteStore(BaseStore):
             return None
 
     async def _filter_items(
-        self, db: aiosqlite.Connection, op: SearchOp
+        self, db: aiosqlite.Connection, op: SearchOp, query_vector: Optional[List[float]] = None
     ) -> List[Tuple[Item, List[List[float]]]]:
         """Filter items by namespace and filter function.
 
+        For a semantic search, the vectors of the items are read in the same query, joined to
+        their items, so the search costs one query however many items match. With the
+        approximate index, only the items with vectors in the lists nearest the query are
+        read, unless fewer of them match than the search asks for.
+
         Args:
             db (aiosqlite.Connection): Database connection
             op (SearchOp): Search operation
+            query_vector (Optional[List[float]]): Embedding of the search query
 
         Returns:
             List[Tuple[Item, List[List[float]]]]: Filtered items with their vectors
         """
-        namespace_prefix = "/".join(op.namespace_prefix)
-        query = """
-            SELECT namespace, key, value, created_at, updated_at
-            FROM items
-            WHERE namespace LIKE ?
-        """
-        params = [f"{namespace_prefix}%"]
+        if (
+            query_vector is not None and self._centroids is not None
+            and len(query_vector) == self._centroids.shape[1]
+        ):
+            from . import vector_index
+
+            lists = vector_index.probe(query_vector, self._centroids, self.ann_probes)
+            candidates = await self._read_items(db, op, lists)
+            if len(candidates) >= op.offset + op.limit:
+                return candidates
+        return await self._read_items(db, op)
+
+    async def _read_items(
+        self,
+        db: aiosqlite.Connection,
+        op: SearchOp,
+        lists: Optional[List[int]] = None,
+        paginate: bool = True,
+    ) -> List[Tuple[Item, List[List[float]]]]:
+        """Read the items matching a search, with their vectors for a semantic search.
+
+        The namespace prefix and the filter are matched in SQL, so only matching rows are
+        read; filters that SQL cannot match are applied to the rows read. Without a semantic
+        search, only the requested page of items is returned, read in insertion order.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+            op (SearchOp): Search operation
+            lists (Optional[List[int]]): Only read the items with vectors in these lists of
+                the approximate index
+            paginate (bool): Whether the page may be selected in SQL, when the whole filter is
+                matched there
 
+        Returns:
+            List[Tuple[Item, List[List[float]]]]: Filtered items with their vectors
+        """
+        with_vectors = bool(op.query and self.index_config)
+        if lists is not None:
+            query = """
+                SELECT items.namespace, items.key, items.value, items.created_at, items.updated_at,
+                       vectors.vector, {valid}
+                FROM vectors
+                JOIN items ON items.namespace = vectors.namespace AND items.key = vectors.key
+            """
+        elif with_vectors:
+            query = """
+                SELECT items.namespace, items.key, items.value, items.created_at, items.updated_at,
+                       vectors.vector, {valid}
+                FROM items
+                LEFT JOIN vectors ON vectors.namespace = items.namespace AND vectors.key = items.key
+            """
+        else:
+            query = """
+                SELECT items.namespace, items.key, items.value, items.created_at, items.updated_at, NULL,
+                       {valid}
+                FROM items
+            """
+
+        conditions, params = self._namespace_conditions(op.namespace_prefix)
+        if lists is not None:
+            conditions.append(f"vectors.list_id IN ({', '.join('?' * len(lists))})")
+            params.extend(lists)
+        filter_conditions, filter_params, remaining_filter = self._compile_filter(op.filter or {})
+        conditions.extend(filter_conditions)
+        params.extend(filter_params)
+        # Values SQLite does not parse, such as NaN, are kept by the conditions and matched
+        # against the whole filter below
+        query = query.format(valid="json_valid(items.value)" if filter_conditions else "1")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        paged = paginate and not with_vectors and not remaining_filter
+        if not with_vectors:
+            query += " ORDER BY items.rowid"
+        if paged:
+            query += " LIMIT ? OFFSET ?"
+            params.extend((op.limit, op.offset))
+
+        # Keyed by namespace and key, as an item comes once per vector
+        filtered: Dict[Tuple[str, str], Optional[Tuple[Item, List[List[float]]]]] = {}
         async with db.execute(query, params) as cursor:
-            rows = await cursor.fetchall()
-            filtered = []
-            for row in rows:
-                item = Item(
-                    namespace=tuple(row[0].split("/")),
-                    key=row[1],
-                    value=json.loads(row[2]),
-                    created_at=datetime.fromisoformat(row[3]),
-                    updated_at=datetime.fromisoformat(row[4])
-                )
-                if not op.filter or all(
-                    self._compare_values(item.value.get(key), filter_value)
-                    for key, filter_value in op.filter.items()
-                ):
-                    if op.query and self.index_config:
-                        vectors = await self._get_vectors(db, item.namespace, item.key)
-                        filtered.append((item, vectors))
-                    else:
-                        filtered.append((item, []))
-            return filtered
+            async for namespace, key, value, created_at, updated_at, vector, valid in cursor:
+                if (namespace, key) in filtered:
+                    entry = filtered[(namespace, key)]
+                else:
+                    item = Item(
+                        namespace=tuple(namespace.split("/")),
+                        key=key,
+                        value=json.loads(value),
+                        created_at=datetime.fromisoformat(created_at),
+                        updated_at=datetime.fromisoformat(updated_at)
+                    )
+                    matches = all(
+                        self._compare_values(item.value.get(filter_key), filter_value)
+                        for filter_key, filter_value in (remaining_filter if valid else op.filter).items()
+                    )
+                    if paged and not matches:
+                        # The page counted a row that does not match
+                        return await self._read_items(db, op, lists, paginate=False)
+                    entry = filtered[(namespace, key)] = (item, []) if matches else None
+                if entry is not None and vector is not None:
+                    entry[1].append(decode_vector(vector))
+        candidates = [entry for entry in filtered.values() if entry is not None]
+        if not with_vectors and not paged:
+            return candidates[op.offset:op.offset + op.limit]
+        return candidates
+
+    def _namespace_conditions(self, namespace_prefix: Tuple[str, ...]) -> Tuple[List[str], List[Any]]:
+        """Build the SQL conditions matching the namespaces under a prefix.
+
+        The prefix is matched as a range of the primary key, which SQLite searches with its
+        index: "a/b" matches the namespace "a/b" itself and those from "a/b/" up to "a/b0",
+        "0" following "/".
 
-    async def _get_vectors(
-        self, db: aiosqlite.Connection, namespace: Tuple[str, ...], key: str
-    ) -> List[List[float]]:
-        """Get vectors for an item.
+        Args:
+            namespace_prefix (Tuple[str, ...]): The namespace prefix
+
+        Returns:
+            Tuple[List[str], List[Any]]: The conditions and their parameters
+        """
+        if not namespace_prefix:
+            return [], []
+        prefix = "/".join(namespace_prefix)
+        return (
+            ["(items.namespace = ? OR (items.namespace >= ? AND items.namespace < ?))"],
+            [prefix, f"{prefix}/", f"{prefix}0"],
+        )
+
+    def _compile_filter(self, filter: Dict[str, Any]) -> Tuple[List[str], List[Any], Dict[str, Any]]:
+        """Compile a search filter into SQL conditions on the JSON values of the items.
+
+        A condition is true or false only where SQL decides the comparison exactly as
+        `_compare_values` does, and NULL where it cannot: a range comparison with a numeric
+        string or a float, which `float()` accepts or rejects, or an equality with a float.
+        Rows are read unless a condition is false, and the keys whose conditions can be NULL
+        are matched again in Python on the rows read, as are all keys on values SQLite cannot
+        parse. Comparisons with objects or lists, and
+        operands SQLite cannot bind exactly, are only matched in Python.
 
         Args:
-            db (aiosqlite.Connection): Database connection
-            namespace (Tuple[str, ...]): Item namespace
-            key (str): Item key
+            filter (Dict[str, Any]): The search filter
 
         Returns:
-            List[List[float]]: List of vectors
+            Tuple[List[str], List[Any], Dict[str, Any]]: The conditions, their parameters, and
+                the part of the filter to match in Python
         """
-        async with db.execute(
-            "SELECT vector FROM vectors WHERE namespace = ? AND key = ?",
-            ("/".join(namespace), key)
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [json.loads(row[0]) for row in rows]
+        conditions, params, remaining = [], [], {}
+        for key, filter_value in filter.items():
+            # SQLite matches JSON paths against the keys as stored, with non-ASCII characters
+            # escaped by json.dumps, and its paths have no escapes for quotes
+            if not key.isascii() or '"' in key or "\\" in key:
+                remaining[key] = filter_value
+                continue
+            path = f'$."{key}"'
+            if isinstance(filter_value, dict) and any(k.startswith("$") for k in filter_value):
+                compiled = [self._compile_operator(path, op, value) for op, value in filter_value.items()]
+            else:
+                compiled = [self._compile_operator(path, "$eq", filter_value)]
+            if any(condition is None for condition in compiled):
+                remaining[key] = filter_value
+                continue
+            for condition, condition_params, exact in compiled:
+                conditions.append(f"coalesce(CASE WHEN json_valid(items.value) THEN {condition} END, 1)")
+                params.extend(condition_params)
+                if not exact:
+                    remaining[key] = filter_value
+        return conditions, params, remaining
+
+    def _compile_operator(self, path: str, operator: str, value: Any) -> Optional[Tuple[str, List[Any], bool]]:
+        """Compile one comparison of the value at a JSON path, or return None if it cannot be.
+
+        Args:
+            path (str): JSON path of the compared value
+            operator (str): Operator to apply
+            value (Any): Value to compare against
+
+        Returns:
+            Optional[Tuple[str, List[Any], bool]]: The condition, its parameters, and whether
+                it is never NULL
+        """
+        extract = "json_extract(items.value, ?)"
+        json_type = "json_type(items.value, ?)"
+        # Booleans, extracted as 1 and 0, and integers SQLite holds exactly as 64-bit integers
+        exact_number = f"{json_type} IN ('true', 'false') OR typeof({extract}) = 'integer'"
+        if operator in ("$eq", "$ne"):
+            if value is None:
+                condition, params, exact = f"({extract} IS NULL)", [path], True
+            elif isinstance(value, str):
+                try:
+                    value.encode()
+                except UnicodeEncodeError:
+                    return None
+                condition, params, exact = f"({json_type} IS 'text' AND {extract} IS ?)", [path, path, value], True
+            elif isinstance(value, bool) or isinstance(value, int) and abs(value) <= 2 ** 53:
+                # Like in Python, True equals 1. Other types never equal a number, floats and
+                # integers beyond 64 bits are left undecided
+                condition = (
+                    f"(CASE WHEN {exact_number} THEN {extract} = ? "
+                    f"WHEN {json_type} IN ('integer', 'real') THEN NULL ELSE 0 END)"
+                )
+                params, exact = [path, path, path, int(value), path], False
+            else:
+                return None
+            if operator == "$ne":
+                condition = f"(NOT {condition})"
+            return condition, params, exact
+
+        comparisons = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+        if operator not in comparisons:
+            return None
+        # `_apply_operator` compares both sides converted with float()
+        try:
+            bound = float(value)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        if not math.isfinite(bound):
+            return None
+        condition = f"(CASE WHEN {exact_number} THEN CAST({extract} AS REAL) {comparisons[operator]} ? END)"
+        return condition, [path, path, path, bound], False
 
     async def _list_namespaces(
         self, db: aiosqlite.Connection, op: ListNamespacesOp
@@ -334,34 +797,22 @@ class SqliteStore(BaseStore):
 
             if op.query and query_vectors:
                 query_vector = query_vectors[op.query]
-                flat_items, flat_vectors = [], []
+                scored_items, owners, flat_vectors = [], [], []
                 scoreless = []
 
                 for item, vectors in candidates:
-                    for vector in vectors:
-                        flat_items.append(item)
-                        flat_vectors.append(vector)
-                    if not vectors:
+                    # Vectors from an embedding model of another dimension cannot be compared
+                    vectors = [vector for vector in vectors if len(vector) == len(query_vector)]
+                    if vectors:
+                        owners.extend([len(scored_items)] * len(vectors))
+                        flat_vectors.extend(vectors)
+                        scored_items.append(item)
+                    else:
                         scoreless.append(item)
 
                 scores = self._cosine_similarity(query_vector, flat_vectors)
-                sorted_results = sorted(
-                    zip(scores, flat_items), key=lambda x: x[0], reverse=True
-                )
-
-                seen = set()
-                kept = []
-                for score, item in sorted_results:
-                    key = (item.namespace, item.key)
-                    if key in seen:
-                        continue
-                    ix = len(seen)
-                    seen.add(key)
-                    if ix >= op.offset + op.limit:
-                        break
-                    if ix < op.offset:
-                        continue
-                    kept.append((score, item))
+                top = self._top_k(scores, owners, len(scored_items), op.offset + op.limit)
+                kept = [(score, scored_items[ix]) for ix, score in top[op.offset:]]
 
                 if scoreless and len(kept) < op.limit:
                     kept.extend(
@@ -388,7 +839,7 @@ class SqliteStore(BaseStore):
                         created_at=item.created_at,
                         updated_at=item.updated_at,
                     )
-                    for (item, _) in candidates[op.offset:op.offset + op.limit]
+                    for (item, _) in candidates
                 ]
 
     async def _apply_put_ops(
@@ -445,15 +896,29 @@ class SqliteStore(BaseStore):
                 f" match number of indices ({len(indices)})"
             )
 
-        for embedding, (ns, key, path) in zip(embeddings, indices):
+        # Vectors are added to the approximate index as they are stored
+        lists = [None] * len(embeddings)
+        if self._centroids is not None:
+            from . import vector_index
+
+            # Embeddings of another dimension than the index stay out of it
+            dims = self._centroids.shape[1]
+            indexed = [i for i, embedding in enumerate(embeddings) if len(embedding) == dims]
+            if indexed:
+                assigned = vector_index.assign([embeddings[i] for i in indexed], self._centroids)
+                for i, list_id in zip(indexed, assigned.tolist()):
+                    lists[i] = list_id
+
+        for embedding, list_id, (ns, key, path) in zip(embeddings, lists, indices):
             await db.execute(
                 """
-                INSERT INTO vectors (namespace, key, path, vector)
-                VALUES (?, ?, ?, ?)
+                INSERT INTO vectors (namespace, key, path, vector, list_id)
+                VALUES (?, ?, ?, ?, ?)
                 ON CONFLICT (namespace, key, path) DO UPDATE SET
-                    vector = excluded.vector
+                    vector = excluded.vector,
+                    list_id = excluded.list_id
                 """,
-                ("/".join(ns), key, path, json.dumps(embedding))
+                ("/".join(ns), key, path, encode_vector(embedding, self.vector_dtype), list_id)
             )
 
     def _extract_texts(
@@ -584,7 +1049,43 @@ class SqliteStore(BaseStore):
         else:
             raise ValueError(f"Unsupported match type: {match_type}")
 
-    def _cosine_similarity(self, X: List[float], Y: List[List[float]]) -> List[float]:
+    def _top_k(
+        self, scores: Sequence[float], owners: List[int], count: int, k: int
+    ) -> List[Tuple[int, float]]:
+        """Find the k items with the best scores, when items can have several vectors.
+
+        Args:
+            scores (Sequence[float]): Score of every vector
+            owners (List[int]): Item of every vector, from 0 to `count`
+            count (int): Number of items
+            k (int): Number of items to return
+
+        Returns:
+            List[Tuple[int, float]]: The best items with their best score, best first
+        """
+        k = min(k, count)
+        if k <= 0:
+            return []
+        np = _numpy()
+        if np is None:
+            best: Dict[int, float] = {}
+            for owner, score in zip(owners, scores):
+                if owner not in best or score > best[owner]:
+                    best[owner] = score
+            return [(ix, best[ix]) for ix in heapq.nlargest(k, best, key=best.__getitem__)]
+
+        scores = np.asarray(scores)
+        if len(owners) == count:
+            best = scores
+        else:
+            best = np.full(count, -np.inf, dtype=scores.dtype)
+            np.maximum.at(best, np.asarray(owners), scores)
+        # Partitioning finds the top k in linear time, only they are sorted
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top], kind="stable")]
+        return [(int(ix), float(best[ix])) for ix in top]
+
+    def _cosine_similarity(self, X: List[float], Y: List[List[float]]) -> Sequence[float]:
         """Compute cosine similarity between a vector X and a matrix Y.
 
         Args:
@@ -592,22 +1093,23 @@ class SqliteStore(BaseStore):
             Y (List[List[float]]): Matrix of vectors to compare against
 
         Returns:
-            List[float]: Cosine similarities
+            Sequence[float]: Cosine similarities, as a NumPy array when NumPy is installed
         """
         if not Y:
             return []
 
         try:
             import numpy as np
-            X_arr = np.array(X) if not isinstance(X, np.ndarray) else X
-            Y_arr = np.array(Y) if not isinstance(Y, np.ndarray) else Y
+            X_arr = np.asarray(X, dtype=np.float32)
+            # Stacks the vectors, decoded as arrays over the stored bytes, into one matrix
+            Y_arr = np.asarray(Y, dtype=np.float32)
             X_norm = np.linalg.norm(X_arr)
             Y_norm = np.linalg.norm(Y_arr, axis=1)
 
             mask = Y_norm != 0
             similarities = np.zeros_like(Y_norm)
             similarities[mask] = np.dot(Y_arr[mask], X_arr) / (Y_norm[mask] * X_norm)
-            return similarities.tolist()
+            return similarities
         except ImportError:
             logger.warning(
                 "NumPy not found. Using pure Python implementation for vector operations. "
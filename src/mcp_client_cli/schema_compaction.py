@@ -0,0 +1,205 @@
+"""Compaction of MCP tool schemas before they are bound to the model.
+
+Tool schemas are sent to the model on every turn, and MCP servers often generate them with
+keys that carry no meaning for the model: `title`s repeating the property name, `null`
+defaults of optional properties, nullable unions for arguments that can simply be left out,
+and `$defs` that are duplicated or used once. Compaction removes these, and caps overly long
+tool descriptions. Compacted tools are what the tools cache stores.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from mcp import types
+
+from .const import BYTES_PER_TOKEN, MAX_TOOL_DESCRIPTION_LENGTH, SCHEMA_COMPACTION_VERSION
+from .storage import CompactionStats
+
+# Keys holding a map of names to schemas
+_SCHEMA_MAPS = ("properties", "patternProperties", "dependentSchemas")
+# Keys holding a schema
+_SCHEMA_VALUES = ("items", "additionalProperties", "not", "if", "then", "else", "contains",
+                  "propertyNames", "unevaluatedItems", "unevaluatedProperties")
+# Keys holding a list of schemas
+_SCHEMA_LISTS = ("anyOf", "oneOf", "allOf", "prefixItems")
+# Keys that mean nothing to the model
+_NOISE_KEYS = ("title", "$schema", "$comment")
+
+
+def _compact_node(schema: Any) -> Any:
+    """Strip the keys of a schema that carry no meaning, recursively."""
+    if not isinstance(schema, dict):
+        return schema
+    compact = {}
+    for key, value in schema.items():
+        if key in _NOISE_KEYS:
+            continue
+        if key == "default" and value is None:
+            continue
+        if key == "additionalProperties" and value is True:
+            continue
+        if key in _SCHEMA_MAPS and isinstance(value, dict):
+            value = {name: _compact_node(item) for name, item in value.items()}
+        elif key in _SCHEMA_VALUES:
+            value = _compact_node(value)
+        elif key in _SCHEMA_LISTS and isinstance(value, list):
+            value = [_compact_node(item) for item in value]
+        elif key in ("$defs", "definitions") and isinstance(value, dict):
+            value = {name: _compact_node(item) for name, item in value.items()}
+        compact[key] = value
+
+    properties = compact.get("properties")
+    if isinstance(properties, dict):
+        required = set(compact.get("required") or [])
+        compact["properties"] = {
+            name: prop if name in required else _drop_null_option(prop)
+            for name, prop in properties.items()
+        }
+    return compact
+
+
+def _drop_null_option(schema: Any) -> Any:
+    """Turn `anyOf: [X, {"type": "null"}]` into X, for an optional property the model can leave out."""
+    if not isinstance(schema, dict) or "default" in schema:
+        return schema
+    options = schema.get("anyOf")
+    if not isinstance(options, list) or len(options) != 2 or {"type": "null"} not in options:
+        return schema
+    other = options[0] if options[1] == {"type": "null"} else options[1]
+    if not isinstance(other, dict):
+        return schema
+    rest = {key: value for key, value in schema.items() if key != "anyOf"}
+    return {**other, **rest}
+
+
+def _refs(schema: Any, found: List[str]) -> List[str]:
+    """Collect the `$ref` values in a schema."""
+    if isinstance(schema, dict):
+        for key, value in schema.items():
+            if key == "$ref" and isinstance(value, str):
+                found.append(value)
+            elif key not in ("enum", "const", "default", "examples"):
+                _refs(value, found)
+    elif isinstance(schema, list):
+        for item in schema:
+            _refs(item, found)
+    return found
+
+
+def _rewrite_refs(schema: Any, defs_key: str, renames: Dict[str, str], inline: Dict[str, Any]) -> Any:
+    """Point references at deduplicated definitions, and inline the ones used once."""
+    if isinstance(schema, list):
+        return [_rewrite_refs(item, defs_key, renames, inline) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    prefix = f"#/{defs_key}/"
+    ref = schema.get("$ref")
+    if isinstance(ref, str) and ref.startswith(prefix):
+        name = renames.get(ref[len(prefix):], ref[len(prefix):])
+        rest = {key: value for key, value in schema.items() if key != "$ref"}
+        if name in inline:
+            # Keys next to the reference, such as a description, override the definition's
+            return _rewrite_refs({**inline[name], **rest}, defs_key, renames, inline)
+        schema = {"$ref": prefix + name, **rest}
+    return {
+        key: value if key in ("enum", "const", "default", "examples")
+        else _rewrite_refs(value, defs_key, renames, inline)
+        for key, value in schema.items()
+    }
+
+
+def _dedupe_defs(schema: dict) -> dict:
+    """Merge identical definitions, inline definitions used once and drop unused ones."""
+    defs_key = "$defs" if "$defs" in schema else "definitions" if "definitions" in schema else None
+    if defs_key is None or not isinstance(schema[defs_key], dict):
+        return schema
+    defs = schema[defs_key]
+    prefix = f"#/{defs_key}/"
+
+    canonical: Dict[str, str] = {}
+    renames: Dict[str, str] = {}
+    for name, definition in defs.items():
+        key = json.dumps(definition, sort_keys=True)
+        renames[name] = canonical.setdefault(key, name)
+    kept = {name: defs[name] for name in dict.fromkeys(renames.values())}
+
+    body = {key: value for key, value in schema.items() if key != defs_key}
+    uses: Dict[str, int] = {}
+    for ref in _refs([body, *kept.values()], []):
+        if ref.startswith(prefix):
+            name = renames.get(ref[len(prefix):], ref[len(prefix):])
+            uses[name] = uses.get(name, 0) + 1
+
+    def recursive(name: str) -> bool:
+        seen, stack = set(), [name]
+        while stack:
+            for ref in _refs(kept.get(stack.pop()), []):
+                target = renames.get(ref[len(prefix):], ref[len(prefix):]) if ref.startswith(prefix) else None
+                if target == name:
+                    return True
+                if target and target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return False
+
+    inline = {name: kept[name] for name in kept if uses.get(name) == 1 and not recursive(name)}
+    remaining = {
+        name: _rewrite_refs(definition, defs_key, renames, inline)
+        for name, definition in kept.items() if uses.get(name) and name not in inline
+    }
+    compact = _rewrite_refs(body, defs_key, renames, inline)
+    if remaining:
+        compact[defs_key] = remaining
+    return compact
+
+
+def compact_schema(schema: dict) -> dict:
+    """Compact a tool input schema, keeping everything that constrains the arguments.
+
+    Args:
+        schema (dict): The JSON schema of the tool arguments.
+
+    Returns:
+        dict: The compacted schema.
+    """
+    return _dedupe_defs(_compact_node(schema))
+
+
+def compact_description(description: Optional[str], limit: int = MAX_TOOL_DESCRIPTION_LENGTH) -> Optional[str]:
+    """Cap a tool description at `limit` characters, cutting at a word boundary."""
+    if not description:
+        return description
+    description = description.strip()
+    if len(description) <= limit:
+        return description
+    cut = description[:limit - 1]
+    return cut[:cut.rfind(" ")].rstrip() + "…" if " " in cut else cut + "…"
+
+
+def schema_tokens(tools: List[types.Tool]) -> int:
+    """Estimate the prompt tokens taken by the names, descriptions and schemas of tools."""
+    return sum(
+        len(tool.name) + len(tool.description or "") + len(json.dumps(tool.inputSchema))
+        for tool in tools
+    ) // BYTES_PER_TOKEN
+
+
+def compact_tools(tools: List[types.Tool]) -> Tuple[List[types.Tool], CompactionStats]:
+    """Compact the descriptions and input schemas of a server's tools.
+
+    Args:
+        tools (List[types.Tool]): The tools listed by the server.
+
+    Returns:
+        Tuple[List[types.Tool], CompactionStats]: The compacted tools, and the estimated tokens
+            of the tools before and after compaction.
+    """
+    compacted = []
+    for tool in tools:
+        schema = compact_schema(tool.inputSchema)
+        description = compact_description(tool.description)
+        # The schema's own description often repeats the tool's
+        if schema.get("description") == tool.description:
+            del schema["description"]
+        compacted.append(tool.model_copy(update={"description": description, "inputSchema": schema}))
+    return compacted, CompactionStats(SCHEMA_COMPACTION_VERSION, schema_tokens(tools), schema_tokens(compacted))
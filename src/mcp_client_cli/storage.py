@@ -1,52 +1,460 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional, List
+from functools import cached_property
+from typing import Any, Dict, Optional, List, Tuple
 from mcp import StdioServerParameters, types
+from mcp.client.session_group import ServerParameters
+import hashlib
 import json
+import os
+import sqlite3
+import time
 import aiosqlite
 import uuid
 
 from .const import *
 
-def get_cached_tools(server_param: StdioServerParameters) -> Optional[List[types.Tool]]:
-    """Retrieve cached tools if available and not expired.
+def _cache_key(server_param: ServerParameters) -> str:
+    """Build the key identifying a server in the caches.
+
+    For a local server, the key hashes the command, its arguments and the environment
+    variables configured for the server, leaving out the ones inherited unchanged from the
+    current process. For a remote server, it hashes the transport and URL.
+    """
+    if not isinstance(server_param, StdioServerParameters):
+        identity = json.dumps([type(server_param).__name__, server_param.url])
+        return hashlib.sha256(identity.encode()).hexdigest()
+    env = {
+        key: value for key, value in (server_param.env or {}).items()
+        if os.environ.get(key) != value
+    }
+    identity = json.dumps([server_param.command, server_param.args, env], sort_keys=True)
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+@dataclass
+class CachedTool:
+    """A tool read from the tools cache.
+
+    It exposes the same attributes as `types.Tool`, but the input schema is only decoded
+    when a tool is actually built from it.
+    """
+    name: str
+    description: Optional[str]
+    input_schema_json: str
+
+    @cached_property
+    def inputSchema(self) -> dict[str, Any]:
+        return json.loads(self.input_schema_json)
+
+
+@dataclass
+class CompactionStats:
+    """How much schema compaction saved on a server's tools.
+
+    Attributes:
+        version (int): The `SCHEMA_COMPACTION_VERSION` the tools were compacted with
+        original_tokens (int): Estimated tokens of the tools as listed by the server
+        compact_tokens (int): Estimated tokens of the compacted tools
+    """
+    version: int
+    original_tokens: int
+    compact_tokens: int
+
+
+# Every server's cached tool list, read from the cache database in one pass on first use
+_tools_cache: Optional[Dict[str, Tuple[datetime, List[CachedTool]]]] = None
+# Compaction stats of every server's cached tools, read along with them
+_compaction_stats: Dict[str, CompactionStats] = {}
+
+
+def _connect_tools_cache() -> sqlite3.Connection:
+    """Open the tools cache database, creating its schema if needed."""
+    TOOLS_CACHE_DB.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(TOOLS_CACHE_DB, timeout=5)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS servers (
+            cache_key TEXT PRIMARY KEY,
+            cached_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tools (
+            cache_key TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            input_schema TEXT NOT NULL,
+            PRIMARY KEY (cache_key, position)
+        );
+        CREATE TABLE IF NOT EXISTS schema_compaction (
+            cache_key TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            original_tokens INTEGER NOT NULL,
+            compact_tokens INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tool_embeddings (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            embedding TEXT NOT NULL,
+            PRIMARY KEY (model, text_hash)
+        );
+    """)
+    return db
+
+
+def _load_tools_cache() -> Dict[str, Tuple[datetime, List[CachedTool]]]:
+    """Read the tool lists of all servers with a single query."""
+    global _tools_cache
+    if _tools_cache is None:
+        _tools_cache = {}
+        db = _connect_tools_cache()
+        try:
+            rows = db.execute("""
+                SELECT servers.cache_key, servers.cached_at, tools.name, tools.description, tools.input_schema
+                FROM servers LEFT JOIN tools ON tools.cache_key = servers.cache_key
+                ORDER BY servers.cache_key, tools.position
+            """)
+            for cache_key, cached_at, name, description, input_schema in rows:
+                _, tools = _tools_cache.setdefault(cache_key, (datetime.fromisoformat(cached_at), []))
+                if name is not None:
+                    tools.append(CachedTool(name, description, input_schema))
+            for cache_key, *stats in db.execute(
+                "SELECT cache_key, version, original_tokens, compact_tokens FROM schema_compaction"
+            ):
+                _compaction_stats[cache_key] = CompactionStats(*stats)
+        finally:
+            db.close()
+    return _tools_cache
+
+
+def get_cached_tools(server_param: ServerParameters) -> Optional[List[CachedTool]]:
+    """Retrieve cached tools if available, even when expired.
+
+    Expired entries are still served so startup never waits on a server; use
+    `is_tools_cache_stale` to decide whether to revalidate them in the background.
     
     Args:
-        server_param (StdioServerParameters): The server parameters to identify the cache.
+        server_param (ServerParameters): The server parameters to identify the cache.
     
     Returns:
-        Optional[List[types.Tool]]: A list of tools if cache is available and not expired, otherwise None.
+        Optional[List[CachedTool]]: A list of tools if cache is available, otherwise None.
     """
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    cache_key = f"{server_param.command}-{'-'.join(server_param.args)}".replace("/", "-")
-    cache_file = CACHE_DIR / f"{cache_key}.json"
-    
-    if not cache_file.exists():
+    entry = _load_tools_cache().get(_cache_key(server_param))
+    if entry is None:
         return None
-        
-    cache_data = json.loads(cache_file.read_text())
-    cached_time = datetime.fromisoformat(cache_data["cached_at"])
-    
-    if datetime.now() - cached_time > timedelta(hours=CACHE_EXPIRY_HOURS):
-        return None
-            
-    return [types.Tool(**tool) for tool in cache_data["tools"]]
+    return entry[1]
+
+
+def is_tools_cache_stale(server_param: ServerParameters) -> bool:
+    """Check whether the cached tools of a server are missing, expired, invalidated or
+    compacted by another version of schema compaction.
+
+    Args:
+        server_param (ServerParameters): The server parameters to identify the cache.
+    """
+    cache_key = _cache_key(server_param)
+    entry = _load_tools_cache().get(cache_key)
+    if entry is None:
+        return True
+    stats = _compaction_stats.get(cache_key)
+    if stats is None or stats.version != SCHEMA_COMPACTION_VERSION:
+        return True
+    return datetime.now() - entry[0] > timedelta(hours=CACHE_EXPIRY_HOURS)
 
 
-def save_tools_cache(server_param: StdioServerParameters, tools: List[types.Tool]) -> None:
+def get_compaction_stats(server_param: ServerParameters) -> Optional[CompactionStats]:
+    """Retrieve how much schema compaction saved on the cached tools of a server.
+
+    Args:
+        server_param (ServerParameters): The server parameters to identify the cache.
+    """
+    _load_tools_cache()
+    return _compaction_stats.get(_cache_key(server_param))
+
+
+def invalidate_tools_cache(server_param: ServerParameters) -> None:
+    """Mark the cached tools of a server as stale.
+
+    The tools stay cached and are served until a refresh replaces them.
+
+    Args:
+        server_param (ServerParameters): The server parameters to identify the cache.
+    """
+    cache_key = _cache_key(server_param)
+    entry = _load_tools_cache().get(cache_key)
+    if entry is None:
+        return
+    invalidated_at = datetime.fromtimestamp(0)
+    db = _connect_tools_cache()
+    try:
+        with db:
+            db.execute(
+                "UPDATE servers SET cached_at = ? WHERE cache_key = ?",
+                (invalidated_at.isoformat(), cache_key)
+            )
+    finally:
+        db.close()
+    _tools_cache[cache_key] = (invalidated_at, entry[1])
+
+
+def save_tools_cache(server_param: ServerParameters, tools: List[types.Tool],
+                     stats: Optional[CompactionStats] = None) -> None:
     """Save tools to cache.
     
     Args:
-        server_param (StdioServerParameters): The server parameters to identify the cache.
+        server_param (ServerParameters): The server parameters to identify the cache.
         tools (List[types.Tool]): The list of tools to be cached.
+        stats (Optional[CompactionStats]): How much compaction saved, if the tools are compacted.
     """
-    cache_key = f"{server_param.command}-{'-'.join(server_param.args)}".replace("/", "-")
-    cache_file = CACHE_DIR / f"{cache_key}.json"
-    
-    cache_data = {
-        "cached_at": datetime.now().isoformat(),
-        "tools": [tool.model_dump() for tool in tools]
-    }
-    cache_file.write_text(json.dumps(cache_data))
+    cache_key = _cache_key(server_param)
+    cached_at = datetime.now()
+    cached_tools = [
+        CachedTool(tool.name, tool.description, json.dumps(tool.inputSchema))
+        for tool in tools
+    ]
+
+    db = _connect_tools_cache()
+    try:
+        with db:
+            db.execute("DELETE FROM tools WHERE cache_key = ?", (cache_key,))
+            db.executemany(
+                "INSERT INTO tools (cache_key, position, name, description, input_schema) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (cache_key, position, tool.name, tool.description, tool.input_schema_json)
+                    for position, tool in enumerate(cached_tools)
+                ]
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO servers (cache_key, cached_at) VALUES (?, ?)",
+                (cache_key, cached_at.isoformat())
+            )
+            if stats:
+                db.execute(
+                    "INSERT OR REPLACE INTO schema_compaction (cache_key, version, original_tokens, compact_tokens) "
+                    "VALUES (?, ?, ?, ?)",
+                    (cache_key, stats.version, stats.original_tokens, stats.compact_tokens)
+                )
+    finally:
+        db.close()
+
+    _load_tools_cache()[cache_key] = (cached_at, cached_tools)
+    if stats:
+        _compaction_stats[cache_key] = stats
+
+
+def get_cached_tool_embeddings(model: str, text_hashes: List[str]) -> Dict[str, List[float]]:
+    """Retrieve the cached embeddings of tool descriptions.
+
+    Args:
+        model (str): The embedding model the embeddings were made with.
+        text_hashes (List[str]): The hashes of the embedded texts, from `tool_text_hash`.
+
+    Returns:
+        Dict[str, List[float]]: The cached embeddings, keyed by text hash.
+    """
+    db = _connect_tools_cache()
+    try:
+        embeddings = {}
+        # Stay below SQLite's limit on the number of query parameters
+        for start in range(0, len(text_hashes), 500):
+            batch = text_hashes[start:start + 500]
+            rows = db.execute(
+                f"SELECT text_hash, embedding FROM tool_embeddings "
+                f"WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                (model, *batch)
+            )
+            embeddings.update((text_hash, json.loads(embedding)) for text_hash, embedding in rows)
+        return embeddings
+    finally:
+        db.close()
+
+
+def save_tool_embeddings(model: str, embeddings: Dict[str, List[float]]) -> None:
+    """Save embeddings of tool descriptions, keyed by the hash of the embedded text.
+
+    Args:
+        model (str): The embedding model the embeddings were made with.
+        embeddings (Dict[str, List[float]]): The embeddings, keyed by text hash.
+    """
+    db = _connect_tools_cache()
+    try:
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO tool_embeddings (model, text_hash, embedding) VALUES (?, ?, ?)",
+                [(model, text_hash, json.dumps(embedding)) for text_hash, embedding in embeddings.items()]
+            )
+    finally:
+        db.close()
+
+
+def tool_text_hash(text: str) -> str:
+    """Hash the text a tool is embedded from, so unchanged tools keep their cached embedding."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# Connection to the tool result cache, kept open as lookups happen on every cacheable tool call
+_tool_results_db: Optional[sqlite3.Connection] = None
+
+
+def _connect_tool_results() -> sqlite3.Connection:
+    """Return the tool result cache connection, opening it and creating its schema on first use."""
+    global _tool_results_db
+    if _tool_results_db is None:
+        TOOLS_CACHE_DB.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(TOOLS_CACHE_DB, timeout=5, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS tool_results (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        _tool_results_db = db
+    return _tool_results_db
+
+
+def tool_result_cache_key(server_param: ServerParameters, tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Build the key of a tool call in the result cache.
+
+    Arguments are canonicalized, so the same call with its arguments in another order hits
+    the same entry.
+    """
+    identity = json.dumps(
+        [_cache_key(server_param), tool_name, arguments],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def get_cached_tool_result(key: str, ttl: float) -> Optional[str]:
+    """Retrieve a cached tool result if it is younger than `ttl` seconds.
+
+    Args:
+        key (str): The key built by `tool_result_cache_key`.
+        ttl (float): Seconds a result stays valid.
+
+    Returns:
+        Optional[str]: The cached result content, or None on a miss.
+    """
+    db = _connect_tool_results()
+    row = db.execute("SELECT content, created_at FROM tool_results WHERE key = ?", (key,)).fetchone()
+    now = time.time()
+    if row is None or now - row[1] > ttl:
+        return None
+    db.execute("UPDATE tool_results SET last_used = ? WHERE key = ?", (now, key))
+    return row[0]
+
+
+def save_tool_result(key: str, content: str) -> None:
+    """Cache a tool result, evicting the least recently used results beyond the size limit.
+
+    Args:
+        key (str): The key built by `tool_result_cache_key`.
+        content (str): The result content returned to the model.
+    """
+    db = _connect_tool_results()
+    now = time.time()
+    with db:
+        db.execute("BEGIN")
+        db.execute(
+            "INSERT OR REPLACE INTO tool_results (key, content, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, content, len(content.encode()), now, now)
+        )
+        db.execute("""
+            DELETE FROM tool_results WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS kept FROM tool_results
+                ) WHERE kept > ?
+            )
+        """, (TOOL_RESULT_CACHE_MAX_BYTES,))
+
+
+def _remove_expired_tool_outputs() -> None:
+    expiry = time.time() - TOOL_OUTPUT_RETENTION_HOURS * 3600
+    for entry in os.scandir(TOOL_OUTPUT_DIR):
+        try:
+            if entry.stat().st_mtime < expiry:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def save_tool_output(data: bytes) -> str:
+    """Save a tool output that is over its budget, for the model to page through.
+
+    Saved outputs are removed after `TOOL_OUTPUT_RETENTION_HOURS`.
+
+    Args:
+        data (bytes): The serialized tool output.
+
+    Returns:
+        str: The handle to read the output back with `read_tool_output_page`.
+    """
+    TOOL_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    _remove_expired_tool_outputs()
+    handle = uuid.uuid4().hex
+    (TOOL_OUTPUT_DIR / f"{handle}.json").write_bytes(data)
+    return handle
+
+
+def read_tool_output_page(handle: str, offset: int, length: int) -> Tuple[bytes, int]:
+    """Read part of a saved tool output.
+
+    Args:
+        handle (str): The handle returned by `save_tool_output`.
+        offset (int): The byte offset to start reading at.
+        length (int): The maximum number of bytes to read.
+
+    Returns:
+        Tuple[bytes, int]: The bytes read and the total size of the output.
+    """
+    # Handles are uuid4 hex strings, which also keeps the path inside TOOL_OUTPUT_DIR
+    if len(handle) != 32 or not all(c in "0123456789abcdef" for c in handle):
+        raise ValueError(f"Invalid tool output handle {handle!r}")
+    with open(TOOL_OUTPUT_DIR / f"{handle}.json", "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(max(offset, 0))
+        return f.read(length), size
+
+
+def get_server_usage_scores() -> Dict[str, float]:
+    """Load the per-server usage scores recorded by previous runs.
+
+    A score is a moving average of how often a run called at least one tool of the server,
+    so 1.0 means every recent run used it and 0.0 means none did.
+
+    Returns:
+        Dict[str, float]: Usage scores keyed by server cache key.
+    """
+    if not USAGE_FILE.exists():
+        return {}
+    try:
+        return json.loads(USAGE_FILE.read_text())
+    except ValueError:
+        return {}
+
+
+def get_server_usage_score(server_param: ServerParameters, scores: Dict[str, float]) -> Optional[float]:
+    """Look up the usage score of a server, None if it has no recorded runs."""
+    return scores.get(_cache_key(server_param))
+
+
+def record_server_usage(usage: List[Tuple[ServerParameters, bool]]) -> None:
+    """Fold the outcome of one run into the per-server usage scores.
+
+    Args:
+        usage (List[Tuple[ServerParameters, bool]]): Each server with whether its tools were called.
+    """
+    scores = get_server_usage_scores()
+    for server_param, used in usage:
+        key = _cache_key(server_param)
+        previous = scores.get(key, float(used))
+        scores[key] = USAGE_SCORE_DECAY * previous + (1 - USAGE_SCORE_DECAY) * float(used)
+    USAGE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    USAGE_FILE.write_text(json.dumps(scores))
 
 
 class ConversationManager:
@@ -0,0 +1,96 @@
+"""Opt-in wall-clock breakdown of a run, reported by `llm --timings`.
+
+Phases are recorded on the module-level `timings` recorder, which does nothing until it is
+enabled, so the instrumentation points can stay in place on every run.
+"""
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+import json
+import sys
+import time
+from typing import Iterator, Optional
+
+
+@dataclass
+class Phase:
+    """A timed phase of the run.
+
+    Attributes:
+        name (str): What was timed, e.g. "tool call"
+        detail (str): Which instance of it, e.g. the server or tool name
+        start (float): Seconds from the start of the run to the start of the phase
+        duration (float): Seconds the phase took
+    """
+    name: str
+    detail: str = ""
+    start: float = 0.0
+    duration: float = 0.0
+
+
+class Timings:
+    """Collects the phases of a run and reports them."""
+
+    def __init__(self):
+        self.enabled = False
+        self.phases: list[Phase] = []
+        self._origin = time.perf_counter()
+
+    def enable(self) -> None:
+        """Start recording, measuring phase starts from now."""
+        self.enabled = True
+        self.phases = []
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str, detail: str = "") -> Iterator[Phase]:
+        """Time the body of the `with` block.
+
+        The yielded phase's `detail` can be updated inside the block, once the outcome is known.
+        """
+        phase = Phase(name, detail)
+        if not self.enabled:
+            yield phase
+            return
+        start = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            self.record(phase.name, start, phase.detail)
+
+    def record(self, name: str, start: float, detail: str = "", end: Optional[float] = None) -> None:
+        """Record a phase that started at the `time.perf_counter()` value `start` and ends at `end` or now."""
+        if not self.enabled:
+            return
+        end = time.perf_counter() if end is None else end
+        self.phases.append(Phase(name, detail, start - self._origin, end - start))
+
+    def report(self, format: str = "table") -> None:
+        """Print the recorded phases to stderr, ordered by start time.
+
+        Args:
+            format (str): "table" for a human readable table, "json" for machine readable output
+        """
+        phases = sorted(self.phases, key=lambda phase: phase.start)
+        total = time.perf_counter() - self._origin
+        if format == "json":
+            print(json.dumps({
+                "total": total,
+                "phases": [asdict(phase) for phase in phases],
+            }), file=sys.stderr)
+            return
+
+        from rich.console import Console
+        from rich.table import Table
+
+        table = Table(title=f"Timings (total {total * 1000:.1f} ms)")
+        table.add_column("Phase")
+        table.add_column("Detail")
+        table.add_column("Start (ms)", justify="right")
+        table.add_column("Duration (ms)", justify="right")
+        for phase in phases:
+            table.add_row(phase.name, phase.detail, f"{phase.start * 1000:.1f}", f"{phase.duration * 1000:.1f}")
+        Console(stderr=True).print(table)
+
+
+timings = Timings()
@@ -1,14 +1,148 @@
-from typing import List, Type, Optional, Any, override
+from typing import Callable, List, Type, Optional, Any, override
 from pydantic import BaseModel
+from langchain_core.messages.content import create_image_block, create_text_block
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool, BaseToolkit, ToolException
 from mcp import StdioServerParameters, types, ClientSession
+from mcp.client.session_group import ServerParameters, SseServerParameters, StreamableHttpParameters
 from mcp.client.stdio import stdio_client
+import mcp.client.stdio
+from mcp.shared.exceptions import McpError
 import pydantic
 from pydantic_core import to_json
-from jsonschema_pydantic import jsonschema_to_pydantic
 import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext, suppress
+from contextvars import ContextVar
+import anyio
+import httpx
+import os
+import signal
+import time
 
+from .config import AppConfig, ServerConfig
+from .schema_compaction import compact_tools
 from .storage import *
+from .timings import timings
+
+class _ServerOutputWatcher:
+    """Wrap the stream of messages read from a server, calling `on_end` once it ends.
+
+    The stream ends when the server closes its output, which it does when it exits.
+    """
+
+    def __init__(self, stream, on_end):
+        self._stream = stream
+        self._on_end = on_end
+
+    async def receive(self):
+        try:
+            return await self._stream.receive()
+        except (anyio.EndOfStream, anyio.ClosedResourceError):
+            self._on_end()
+            raise
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.receive()
+        except anyio.EndOfStream:
+            raise StopAsyncIteration
+
+    async def aclose(self):
+        await self._stream.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def _http_client(headers: Optional[dict[str, str]] = None, timeout: Optional[httpx.Timeout] = None,
+                 auth: Optional[httpx.Auth] = None) -> httpx.AsyncClient:
+    """Create the HTTP client of a remote server session.
+
+    A session sends all its requests through this one client, whose connection pool keeps
+    connections alive between tool calls.
+    """
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=timeout or httpx.Timeout(30.0),
+        auth=auth,
+        follow_redirects=True,
+        limits=httpx.Limits(keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+    )
+
+
+# The stdio client does not expose the server process, which shutdown needs in order to
+# signal servers that ignore their closed stdin. Process creation is wrapped to hand the
+# process to the `on_process` callback of the `connect_server` call spawning it.
+#
+# This relies on `mcp.client.stdio._create_platform_compatible_process`, a private function
+# present with the same role from mcp 1.10 through at least 1.22. If a release renames it,
+# servers are not tracked and shutdown falls back to closing their stdin only.
+_on_process: ContextVar[Optional[Callable[[Any], None]]] = ContextVar("_on_process", default=None)
+_create_server_process = getattr(mcp.client.stdio, "_create_platform_compatible_process", None)
+
+
+async def _create_tracked_server_process(*args, **kwargs):
+    process = await _create_server_process(*args, **kwargs)
+    on_process = _on_process.get()
+    # Only processes that can be signalled are tracked
+    if on_process is not None and hasattr(process, "pid") and hasattr(process, "wait"):
+        on_process(process)
+    return process
+
+
+if _create_server_process is not None:
+    mcp.client.stdio._create_platform_compatible_process = _create_tracked_server_process
+
+
+@asynccontextmanager
+async def connect_server(server_param: ServerParameters, on_process: Optional[Callable[[Any], None]] = None):
+    """Open the transport to a server, yielding its read and write streams.
+
+    Local servers are spawned and spoken to over stdio, remote ones are reached over
+    streamable HTTP or SSE.
+
+    Args:
+        server_param (ServerParameters): The connection parameters of the server.
+        on_process (Optional[Callable[[Any], None]]): Called with the process of a local server
+            once it is spawned.
+    """
+    if isinstance(server_param, StreamableHttpParameters):
+        from mcp.client.streamable_http import streamablehttp_client
+        async with streamablehttp_client(
+            server_param.url, headers=server_param.headers, httpx_client_factory=_http_client
+        ) as (read, write, _):
+            yield read, write
+    elif isinstance(server_param, SseServerParameters):
+        from mcp.client.sse import sse_client
+        async with sse_client(
+            server_param.url, headers=server_param.headers, httpx_client_factory=_http_client
+        ) as (read, write):
+            yield read, write
+    else:
+        token = _on_process.set(on_process)
+        try:
+            async with stdio_client(server_param) as (read, write):
+                _on_process.reset(token)
+                token = None
+                yield read, write
+        finally:
+            if token is not None:
+                _on_process.reset(token)
+
+
+def describe_server(server_param: ServerParameters) -> str:
+    """Describe a server for messages, by its command line or URL."""
+    if isinstance(server_param, StdioServerParameters):
+        return f"{server_param.command} {' '.join(server_param.args)}"
+    return server_param.url
+
 
 class McpServerConfig(BaseModel):
     """Configuration for an MCP server.
@@ -18,92 +152,407 @@ class McpServerConfig(BaseModel):
 
     Attributes:
         server_name (str): The name identifier for this MCP server
-        server_param (StdioServerParameters): Connection parameters for the server, including
-            command, arguments and environment variables
+        server_param (ServerParameters): Connection parameters for the server, the command,
+            arguments and environment variables of a local server, or the URL of a remote one
         exclude_tools (list[str]): List of tool names to exclude from this server
+        idle_timeout (Optional[float]): Seconds of inactivity after which a long-lived
+            session closes the server, None to keep it running
+        max_concurrency (Optional[int]): Maximum tool calls running on the server at once,
+            None for no limit
+        cacheable_tools (dict[str, float]): Idempotent tools whose results are cached, with
+            the seconds each result stays valid
+        output_budget (Optional[int]): Bytes of a tool result sent to the model, larger
+            results are saved to disk and previewed, None for no limit
+        tool_output_budgets (dict[str, int]): Per-tool overrides of `output_budget`
+        timeout (Optional[float]): Seconds a tool call may take before it is cancelled,
+            None for no deadline
+        tool_timeouts (dict[str, float]): Per-tool overrides of `timeout`
+        hedged_tools (list[str]): Read-only tools that get a second, hedged request when
+            slower than `hedge_percentile` of their recent calls
+        hedge_percentile (float): Latency percentile after which hedged tools are retried
     """
     
     server_name: str
-    server_param: StdioServerParameters
+    server_param: ServerParameters
     exclude_tools: list[str] = []
+    idle_timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    cacheable_tools: dict[str, float] = {}
+    output_budget: Optional[int] = None
+    tool_output_budgets: dict[str, int] = {}
+    timeout: Optional[float] = None
+    tool_timeouts: dict[str, float] = {}
+    hedged_tools: list[str] = []
+    hedge_percentile: float = HEDGE_PERCENTILE
 
 class McpToolkit(BaseToolkit):
     name: str
-    server_param: StdioServerParameters
+    server_param: ServerParameters
     exclude_tools: list[str] = []
+    idle_timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    cacheable_tools: dict[str, float] = {}
+    output_budget: Optional[int] = None
+    tool_output_budgets: dict[str, int] = {}
+    timeout: Optional[float] = None
+    tool_timeouts: dict[str, float] = {}
+    hedged_tools: list[str] = []
+    hedge_percentile: float = HEDGE_PERCENTILE
     _session: Optional[ClientSession] = None
     _tools: List[BaseTool] = []
-    _client = None
+    _session_task: Optional[asyncio.Task] = None
+    _starting: Optional[asyncio.Future] = None
+    _closing: Optional[asyncio.Event] = None
     _init_lock: asyncio.Lock = None
+    _call_slots: Optional[asyncio.Semaphore] = None
+    _call_count: int = 0
+    _active_calls: int = 0
+    _last_used: float = 0.0
+    _tools_stale: bool = False
+    _latencies: dict[str, deque] = {}
+    _crashes: int = 0
+    _process: Any = None
 
     model_config = pydantic.ConfigDict(arbitrary_types_allowed=True)
 
     def __init__(self, **data):
         super().__init__(**data)
         self._init_lock = asyncio.Lock()
+        if self.max_concurrency:
+            self._call_slots = asyncio.Semaphore(self.max_concurrency)
 
     async def _start_session(self):
         async with self._init_lock:
             if self._session:
                 return self._session
+            if self._starting is None or self._starting.done():
+                if self._crashes:
+                    await asyncio.sleep(min(RESPAWN_BACKOFF_BASE * 2 ** (self._crashes - 1), RESPAWN_BACKOFF_MAX))
+                self._starting = asyncio.get_running_loop().create_future()
+                self._closing = asyncio.Event()
+                self._session_task = asyncio.create_task(self._run_session(self._starting))
+            # Shielded, so a caller giving up leaves the server starting for the next one
+            return await asyncio.shield(self._starting)
+
+    async def prewarm(self):
+        """Start the session ahead of the first tool call.
+
+        Failures are ignored here, the tool call that needs the session will report them.
+        """
+        try:
+            await self._start_session()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def use_session(self):
+        """Yield an initialized session, marking the toolkit busy while it is in use.
+
+        Concurrent callers share the one session, which matches responses to requests by id.
+        With `max_concurrency` set, callers beyond the limit wait for a slot in arrival order.
+        """
+        session = await self._start_session()
+        self._call_count += 1
+        self._active_calls += 1
+        try:
+            async with self._call_slots or nullcontext():
+                yield session
+        finally:
+            self._active_calls -= 1
+            self._last_used = time.monotonic()
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]) -> types.CallToolResult:
+        """Call a tool on the server within its deadline.
+
+        Hedged tools get a second request once the first is slower than usual, and the
+        first response wins. Requests that are abandoned, by the deadline, a hedge or the
+        caller, are cancelled on the server with `notifications/cancelled`.
+
+        If the server exits during the call, it is respawned. Calls to idempotent tools, the
+        cacheable and hedged ones, are then retried once.
+        """
+        timeout = self.tool_timeouts.get(name, self.timeout)
+        for attempt in range(2):
+            try:
+                # The deadline also covers starting the server and waiting for a call slot
+                async with asyncio.timeout(timeout), self.use_session() as session:
+                    start = time.monotonic()
+                    hedge_delay = self._hedge_delay(name)
+                    if hedge_delay is None:
+                        result = await self._send_call(session, name, arguments)
+                    else:
+                        result = await self._send_hedged_call(session, name, arguments, hedge_delay)
+                break
+            except TimeoutError:
+                raise ToolException(f"Tool {name} did not finish within its {timeout} second deadline")
+            except (McpError, anyio.EndOfStream, anyio.ClosedResourceError, anyio.BrokenResourceError) as e:
+                if isinstance(e, McpError) and e.error.code != types.CONNECTION_CLOSED:
+                    raise
+                if attempt or not self.is_idempotent(name):
+                    raise ToolException(f"Server {self.name} exited during the call to {name}") from e
+        self._crashes = 0
+        if name in self.hedged_tools:
+            self._latencies.setdefault(name, deque(maxlen=HEDGE_WINDOW)).append(time.monotonic() - start)
+        return result
+
+    def is_idempotent(self, name: str) -> bool:
+        """Whether a tool is safe to call again with the same arguments."""
+        return name in self.cacheable_tools or name in self.hedged_tools
+
+    def _hedge_delay(self, name: str) -> Optional[float]:
+        """Return how long to wait before hedging a call, None to not hedge it."""
+        latencies = self._latencies.get(name)
+        if name not in self.hedged_tools or not latencies or len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(int(len(ordered) * self.hedge_percentile / 100), len(ordered) - 1)]
+
+    async def _send_call(self, session: ClientSession, name: str, arguments: dict[str, Any]) -> types.CallToolResult:
+        # The session assigns this id to the request below, before it first yields to the event loop
+        request_id = session._request_id
+        try:
+            return await session.call_tool(name, arguments=arguments)
+        except asyncio.CancelledError:
+            with suppress(Exception):
+                await session.send_notification(types.ClientNotification(types.CancelledNotification(
+                    params=types.CancelledNotificationParams(requestId=request_id, reason="Cancelled by the client")
+                )))
+            raise
+
+    async def _send_hedged_call(self, session: ClientSession, name: str, arguments: dict[str, Any],
+                                hedge_delay: float) -> types.CallToolResult:
+        calls = [asyncio.create_task(self._send_call(session, name, arguments))]
+        try:
+            done, _ = await asyncio.wait(calls, timeout=hedge_delay)
+            if not done:
+                calls.append(asyncio.create_task(self._send_call(session, name, arguments)))
+                done, _ = await asyncio.wait(calls, return_when=asyncio.FIRST_COMPLETED)
+            first = done.pop()
+            if first.exception() and len(calls) > 1:
+                # The other request may still succeed
+                other = calls[1] if first is calls[0] else calls[0]
+                return await other
+            return first.result()
+        finally:
+            for call in calls:
+                call.cancel()
+            await asyncio.gather(*calls, return_exceptions=True)
+
+    async def evict_if_idle(self) -> bool:
+        """Close the session if it has been idle longer than `idle_timeout`.
+
+        The next tool call respawns the server lazily.
+
+        Returns:
+            bool: Whether the session was closed.
+        """
+        if not self._is_idle():
+            return False
+        async with self._init_lock:
+            # A session start or tool call may have happened while waiting for the lock
+            if not self._is_idle():
+                return False
+            await self.close()
+        return True
+
+    def _is_idle(self) -> bool:
+        return (
+            bool(self.idle_timeout) and self.has_session and not self._active_calls
+            and time.monotonic() - self._last_used >= self.idle_timeout
+        )
+
+    @property
+    def has_session(self) -> bool:
+        """Whether a session is open or being started."""
+        return self._session is not None or (
+            self._session_task is not None and not self._session_task.done()
+        )
+
+    @property
+    def call_count(self) -> int:
+        """Number of tool calls made through this toolkit."""
+        return self._call_count
+
+    @property
+    def has_output_budget(self) -> bool:
+        """Whether any of the tools can return a truncated result."""
+        return bool(self.output_budget or any(self.tool_output_budgets.values()))
+
+    def output_budget_for(self, tool_name: str) -> Optional[int]:
+        """Return the output budget of a tool in bytes, None for no limit."""
+        return self.tool_output_budgets.get(tool_name, self.output_budget)
+
+    @property
+    def tools_stale(self) -> bool:
+        """Whether the tools were served from an expired cache or the server changed its tool list."""
+        return self._tools_stale
+
+    async def _handle_message(self, message) -> None:
+        """Handle messages from the server that are not responses to our requests.
+
+        This runs inside the session's receive loop, so it must not send requests itself.
+        """
+        if isinstance(message, types.ServerNotification) and \
+                isinstance(message.root, types.ToolListChangedNotification):
+            self._tools_stale = True
+            invalidate_tools_cache(self.server_param)
+
+    async def _run_session(self, ready: asyncio.Future):
+        """Own the server connection for its whole lifetime.
+
+        The stdio client and session are entered and exited in this one task, so the session
+        stays usable from any task (tool calls, the daemon's request handlers) until `close()`.
+
+        When the server exits on its own, the session is dropped at once, so the next call
+        respawns the server after a backoff, and the task winds down the dead connection.
+        """
+        closing = self._closing
+        session = None
+        crashed = False
 
-            self._client = stdio_client(self.server_param)
-            read, write = await self._client.__aenter__()
-            self._session = ClientSession(read, write)
-            await self._session.__aenter__()
-            await self._session.initialize()
-            return self._session
+        def on_server_exit():
+            nonlocal crashed
+            if closing.is_set():
+                return
+            crashed = True
+            if session is not None and self._session is session:
+                self._session = None
+            closing.set()
+
+        try:
+            spawn_start = time.perf_counter()
+            async with connect_server(self.server_param, self._set_process) as (read, write):
+                timings.record("server spawn", spawn_start, self.name)
+                read = _ServerOutputWatcher(read, on_server_exit)
+                async with ClientSession(read, write, message_handler=self._handle_message) as session:
+                    with timings.phase("server initialize", self.name):
+                        await session.initialize()
+                    if not closing.is_set():
+                        self._session = session
+                    self._last_used = time.monotonic()
+                    ready.set_result(session)
+                    await closing.wait()
+                    if crashed:
+                        # Tearing the session down cancels its receive loop before that can fail
+                        # the requests in flight, so end them here for their callers to retry
+                        for stream in list(session._response_streams.values()):
+                            await stream.aclose()
+        except Exception as e:
+            crashed = True
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            if session is not None and self._session is session:
+                self._session = None
+            if crashed:
+                self._crashes += 1
+            if not ready.done():
+                ready.cancel()
 
     async def initialize(self, force_refresh: bool = False):
         if self._tools and not force_refresh:
             return
 
-        cached_tools = get_cached_tools(self.server_param)
+        with timings.phase("tools cache lookup", self.name) as phase:
+            cached_tools = get_cached_tools(self.server_param)
+            if cached_tools and not force_refresh:
+                self._tools_stale = is_tools_cache_stale(self.server_param)
+                phase.detail += ": stale" if self._tools_stale else ": hit"
+            else:
+                phase.detail += ": miss"
         if cached_tools and not force_refresh:
-            for tool in cached_tools:
-                if tool.name in self.exclude_tools:
-                    continue
-                self._tools.append(create_langchain_tool(tool, self._session, self))
+            # Expired tools are served as is and revalidated after the response
+            self._tools = self._create_tools(cached_tools)
             return
 
+        await self.refresh_tools()
+
+    async def refresh_tools(self) -> List[BaseTool]:
+        """Fetch the tool list from the server and replace the cached tools with it."""
         try:
-            await self._start_session()
-            tools: types.ListToolsResult = await self._session.list_tools()
-            save_tools_cache(self.server_param, tools.tools)
-            for tool in tools.tools:
-                if tool.name in self.exclude_tools:
-                    continue
-                self._tools.append(create_langchain_tool(tool, self._session, self))
+            try:
+                async with asyncio.timeout(TOOLS_LIST_TIMEOUT):
+                    session = await self._start_session()
+                    # Cleared before the request, so a change notified meanwhile marks the tools stale again
+                    self._tools_stale = False
+                    with timings.phase("list_tools", self.name):
+                        tools: types.ListToolsResult = await session.list_tools()
+            except TimeoutError:
+                raise TimeoutError(f"no tool list within {TOOLS_LIST_TIMEOUT} seconds") from None
         except Exception as e:
-            print(f"Error gathering tools for {self.server_param.command} {' '.join(self.server_param.args)}: {e}")
+            self._tools_stale = True
+            print(f"Error gathering tools for {describe_server(self.server_param)}: {e}")
             raise e
-        
-    async def close(self):
+        with timings.phase("schema compaction") as phase:
+            compacted, stats = compact_tools(tools.tools)
+            phase.detail = f"{self.name}: {stats.original_tokens} -> {stats.compact_tokens} tokens"
+        save_tools_cache(self.server_param, compacted, stats)
+        self._tools = self._create_tools(compacted)
+        return self._tools
+
+    def _create_tools(self, tool_schemas: List[types.Tool | CachedTool]) -> List[BaseTool]:
+        with timings.phase("schema conversion") as phase:
+            tools = [
+                create_langchain_tool(tool, self)
+                for tool in tool_schemas if tool.name not in self.exclude_tools
+            ]
+            phase.detail = f"{self.name}: {len(tools)} tools"
+        return tools
+
+    def _set_process(self, process) -> None:
+        self._process = process
+
+    async def close(self, timeout: float = SHUTDOWN_TIMEOUT):
+        """Close the session, terminating the server if it has not exited after `timeout` seconds.
+
+        A server that outlives the timeout is sent SIGTERM, then SIGKILL if it is still running
+        `SHUTDOWN_KILL_GRACE` seconds later.
+        """
+        if not self._session_task:
+            return
+        session_task = self._session_task
+        self._closing.set()
         try:
-            if self._session:
-                try:
-                    # Add timeout to prevent hanging
-                    async with asyncio.timeout(2.0):
-                        # Create a new task to handle cleanup in the correct context
-                        await asyncio.create_task(self._session.__aexit__(None, None, None))
-                except asyncio.TimeoutError:
-                    pass
-                except Exception as e:
-                    pass
+            async with asyncio.timeout(timeout):
+                # Shielded, so the session keeps winding down while the server is terminated
+                await asyncio.shield(session_task)
+        except TimeoutError:
+            await self._terminate_server()
+            session_task.cancel()
+            with suppress(BaseException):
+                async with asyncio.timeout(SHUTDOWN_KILL_GRACE):
+                    await session_task
+        except Exception:
+            pass
         finally:
-            try:
-                if self._client:
-                    try:
-                        # Add timeout to prevent hanging
-                        async with asyncio.timeout(2.0):
-                            # Create a new task to handle cleanup in the correct context
-                            await asyncio.create_task(self._client.__aexit__(None, None, None))
-                    except asyncio.TimeoutError:
-                        pass
-                    except Exception as e:
-                        pass
-            except:
-                pass
+            if self._session_task is session_task:
+                self._session_task = None
+            self._process = None
+
+    async def _terminate_server(self) -> None:
+        """Send SIGTERM to the server, then SIGKILL if it does not exit.
+
+        A server started in its own process group is signalled with that group, which holds
+        the processes it spawned. Servers sharing llm's process group, as started by mcp
+        releases before 1.11, are signalled alone.
+        """
+        process = self._process
+        if process is None:
+            return
+        for kill in (False, True):
+            if process.returncode is not None:
+                return
+            with suppress(OSError):
+                group = os.getpgid(process.pid) if hasattr(os, "killpg") else None
+                if group is not None and group != os.getpgrp():
+                    os.killpg(group, signal.SIGKILL if kill else signal.SIGTERM)
+                elif kill:
+                    process.kill()
+                else:
+                    process.terminate()
+            with suppress(TimeoutError):
+                async with asyncio.timeout(SHUTDOWN_KILL_GRACE):
+                    await process.wait()
 
     def get_tools(self) -> List[BaseTool]:
         return self._tools
@@ -113,8 +562,7 @@ class McpTool(BaseTool):
     toolkit_name: str
     name: str
     description: str
-    args_schema: Type[BaseModel]
-    session: Optional[ClientSession]
+    args_schema: dict[str, Any]
     toolkit: McpToolkit
 
     handle_tool_error: bool = True
@@ -122,26 +570,154 @@ class McpTool(BaseTool):
     def _run(self, **kwargs):
         raise NotImplementedError("Only async operations are supported")
 
-    async def _arun(self, **kwargs):
-        if not self.session:
-            self.session = await self.toolkit._start_session()
+    async def _arun(self, run_config: RunnableConfig, **kwargs):
+        ttl = self.toolkit.cacheable_tools.get(self.name)
+        if ttl:
+            cache_key = tool_result_cache_key(self.toolkit.server_param, self.name, kwargs)
+            if run_config.get("configurable", {}).get("tool_cache", True):
+                lookup_start = time.perf_counter()
+                cached = get_cached_tool_result(cache_key, ttl)
+                if cached is not None:
+                    timings.record("tool call", lookup_start, f"{self.toolkit_name}.{self.name}: cached")
+                    return cached
 
-        result = await self.session.call_tool(self.name, arguments=kwargs)
-        content = to_json(result.content).decode()
-        if result.isError:
+        # The session may have been started in the background by `McpToolkit.prewarm`,
+        # or evicted while idle and respawned here.
+        with timings.phase("tool call", f"{self.toolkit_name}.{self.name}"):
+            result = await self.toolkit.call_tool(self.name, kwargs)
+        budget = self.toolkit.output_budget_for(self.name)
+        if has_binary_content(result.content):
+            # Binary content is not sent as base64 text, so these results are not serialized,
+            # cached or held to the output budget as a whole
+            images = run_config.get("configurable", {}).get("tool_images", False)
+            blocks = tool_content_blocks(result.content, budget, images=images)
+            text = "\n".join(block["text"] for block in blocks if block["type"] == "text")
+            if result.isError:
+                raise ToolException(text)
+            # Without images, the blocks are all text, sent as one string as any provider accepts
+            return blocks if images else text
+        data = to_json(result.content)
+        is_error = result.isError
+        # Drop the parsed result early, a large output should only stay in memory as bytes
+        del result
+        content = preview_tool_output(data, budget) if budget and len(data) > budget else data.decode()
+        if is_error:
             raise ToolException(content)
+        if ttl:
+            save_tool_result(cache_key, content)
         return content
 
+def preview_tool_output(data: bytes, budget: int) -> str:
+    """Save an output that is over its budget and return a preview of it.
+
+    The preview holds the head and tail of the output within the budget, and the handle the
+    model can page through the rest with the `read_tool_output` tool.
+
+    Args:
+        data (bytes): The serialized tool output.
+        budget (int): The output budget in bytes.
+
+    Returns:
+        str: The preview sent to the model instead of the output.
+    """
+    handle = save_tool_output(data)
+    head = data[:budget * 2 // 3].decode(errors="ignore")
+    tail = data[len(data) - budget // 3:].decode(errors="ignore")
+    return (
+        f"[Output truncated: {len(data)} bytes, over the {budget} byte budget. "
+        f'Call read_tool_output with handle "{handle}" and a byte offset to read the rest.]\n'
+        f"--- first {budget * 2 // 3} bytes ---\n{head}\n"
+        f"--- last {budget // 3} bytes ---\n{tail}"
+    )
+
+
+def has_binary_content(content: list[types.ContentBlock]) -> bool:
+    """Check if a tool result holds images, audio or binary resources."""
+    return any(
+        isinstance(item, (types.ImageContent, types.AudioContent))
+        or isinstance(item, types.EmbeddedResource) and isinstance(item.resource, types.BlobResourceContents)
+        for item in content
+    )
+
+
+def tool_content_blocks(content: list[types.ContentBlock], budget: Optional[int] = None,
+                        images: bool = True) -> list[dict]:
+    """Convert a tool result holding binary content to the content blocks of a tool message.
+
+    Images become image blocks the model can look at, when its provider accepts images in
+    tool results. Otherwise images, like audio and binary resources, are referenced by their
+    type and size instead of being inlined as base64 text. Text, and text resources, become
+    text blocks, each held to the output budget.
+
+    Args:
+        content (list[types.ContentBlock]): The content of the MCP tool result.
+        budget (Optional[int]): The output budget in bytes of every text block.
+        images (bool): Whether images can be sent to the model in a tool message.
+
+    Returns:
+        list[dict]: The content blocks of the tool message.
+    """
+    def text_block(text: str) -> dict:
+        if budget and len(text) > budget:
+            data = text.encode()
+            if len(data) > budget:
+                text = preview_tool_output(data, budget)
+        return create_text_block(text)
+
+    blocks = []
+    for item in content:
+        if isinstance(item, types.TextContent):
+            blocks.append(text_block(item.text))
+        elif isinstance(item, types.ImageContent) and images:
+            blocks.append(create_image_block(base64=item.data, mime_type=item.mimeType))
+        elif isinstance(item, types.ImageContent):
+            blocks.append(create_text_block(
+                f"[Image content: {item.mimeType}, {len(item.data) * 3 // 4} bytes, not shown, "
+                "as the model provider does not accept images in tool results]"
+            ))
+        elif isinstance(item, types.AudioContent):
+            # base64 encodes 3 bytes in 4 characters
+            blocks.append(create_text_block(
+                f"[Audio content: {item.mimeType}, {len(item.data) * 3 // 4} bytes, not shown]"
+            ))
+        elif isinstance(item, types.EmbeddedResource):
+            resource = item.resource
+            if isinstance(resource, types.TextResourceContents):
+                blocks.append(text_block(f"[Resource {resource.uri}]\n{resource.text}"))
+            else:
+                blocks.append(create_text_block(
+                    f"[Binary resource {resource.uri}: {resource.mimeType or 'unknown type'}, "
+                    f"{len(resource.blob) * 3 // 4} bytes, not shown]"
+                ))
+        elif isinstance(item, types.ResourceLink):
+            blocks.append(create_text_block(f"[Resource link {item.uri}: {item.name}]"))
+    return blocks
+
+
+def tool_args_schema(input_schema: dict[str, Any]) -> dict[str, Any]:
+    """Prepare an MCP tool input schema for binding to the model.
+
+    The JSON schema is bound as is instead of being converted to a pydantic model, so
+    building tools costs no schema conversion. Arguments are validated by the MCP server.
+
+    Args:
+        input_schema (dict[str, Any]): The MCP tool input schema.
+
+    Returns:
+        dict[str, Any]: The schema, with the object type and properties LangChain expects.
+    """
+    return {"type": "object", "properties": {}, **input_schema}
+
+
 def create_langchain_tool(
-    tool_schema: types.Tool,
-    session: ClientSession,
+    tool_schema: types.Tool | CachedTool,
     toolkit: McpToolkit,
 ) -> BaseTool:
     """Create a LangChain tool from MCP tool schema.
     
     Args:
-        tool_schema (types.Tool): The MCP tool schema.
-        session (ClientSession): The session for the tool.
+        tool_schema (types.Tool | CachedTool): The MCP tool schema, fresh or from the cache.
+        toolkit (McpToolkit): The toolkit whose session runs the tool.
     
     Returns:
         BaseTool: The created LangChain tool.
@@ -149,8 +725,7 @@ def create_langchain_tool(
     return McpTool(
         name=tool_schema.name,
         description=tool_schema.description,
-        args_schema=jsonschema_to_pydantic(tool_schema.inputSchema),
-        session=session,
+        args_schema=tool_args_schema(tool_schema.inputSchema),
         toolkit=toolkit,
         toolkit_name=toolkit.name,
     )
@@ -169,7 +744,87 @@ async def convert_mcp_to_langchain_tools(server_config: McpServerConfig, force_r
     toolkit = McpToolkit(
         name=server_config.server_name, 
         server_param=server_config.server_param,
-        exclude_tools=server_config.exclude_tools
+        exclude_tools=server_config.exclude_tools,
+        idle_timeout=server_config.idle_timeout,
+        max_concurrency=server_config.max_concurrency,
+        cacheable_tools=server_config.cacheable_tools,
+        output_budget=server_config.output_budget,
+        tool_output_budgets=server_config.tool_output_budgets,
+        timeout=server_config.timeout,
+        tool_timeouts=server_config.tool_timeouts,
+        hedged_tools=server_config.hedged_tools,
+        hedge_percentile=server_config.hedge_percentile
     )
     await toolkit.initialize(force_refresh=force_refresh)
     return toolkit
+
+
+def build_server_configs(app_config: AppConfig) -> list[McpServerConfig]:
+    """Build the MCP server configurations for every enabled server.
+
+    Args:
+        app_config (AppConfig): The loaded application configuration.
+
+    Returns:
+        list[McpServerConfig]: One configuration per enabled server.
+    """
+    return [
+        McpServerConfig(
+            server_name=name,
+            server_param=build_server_param(config),
+            exclude_tools=config.exclude_tools or [],
+            idle_timeout=config.idle_timeout or None,
+            max_concurrency=config.max_concurrency or None,
+            cacheable_tools=config.cacheable_tools or {},
+            output_budget=config.output_budget,
+            tool_output_budgets=config.tool_output_budgets or {},
+            timeout=config.timeout or None,
+            tool_timeouts=config.tool_timeouts or {},
+            hedged_tools=config.hedged_tools or [],
+            hedge_percentile=config.hedge_percentile
+        )
+        for name, config in app_config.get_enabled_servers().items()
+    ]
+
+
+def build_server_param(config: ServerConfig) -> ServerParameters:
+    """Build the connection parameters of a server from its configuration."""
+    if config.url:
+        if config.transport == "sse":
+            return SseServerParameters(url=config.url, headers=config.headers or None)
+        return StreamableHttpParameters(url=config.url, headers=config.headers or None)
+    return StdioServerParameters(
+        command=config.command,
+        args=config.args or [],
+        env={**(config.env or {}), **os.environ}
+    )
+
+
+async def close_toolkits(toolkits: List[McpToolkit], timeout: float = SHUTDOWN_TIMEOUT) -> None:
+    """Close toolkits concurrently, under one deadline for all of them.
+
+    Servers still running `timeout` seconds from now are terminated, so shutdown takes at most
+    the timeout plus the termination grace periods, however many servers there are.
+    """
+    await asyncio.gather(*(toolkit.close(timeout) for toolkit in toolkits), return_exceptions=True)
+
+
+async def load_tools(server_configs: list[McpServerConfig], no_tools: bool, force_refresh: bool) -> tuple[list, list]:
+    """Load and convert MCP tools to LangChain tools."""
+    if no_tools:
+        return [], []
+
+    toolkits = []
+    langchain_tools = []
+
+    async def convert_toolkit(server_config: McpServerConfig):
+        with timings.phase("tool load", server_config.server_name):
+            toolkit = await convert_mcp_to_langchain_tools(server_config, force_refresh)
+        toolkits.append(toolkit)
+        langchain_tools.extend(toolkit.get_tools())
+
+    async with anyio.create_task_group() as tg:
+        for server_param in server_configs:
+            tg.start_soon(convert_toolkit, server_param)
+
+    return toolkits, langchain_tools
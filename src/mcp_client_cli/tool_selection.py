@@ -0,0 +1,211 @@
+"""Retrieval-based selection of the tools bound to the model.
+
+Binding every tool of every server sends all their schemas on every model turn, which
+costs thousands of prompt tokens once many servers are enabled. The selector ranks the
+tools against the user's query with BM25 over their names and descriptions, optionally
+blended with embedding similarity, and binds only the best `top_k` of them. Pinned tools
+are always bound, and the model can bind more with the `find_tools` tool.
+"""
+
+from collections import Counter
+import logging
+import math
+import re
+from typing import List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool, StructuredTool
+
+from .const import FIND_TOOLS_LIMIT
+from .storage import get_cached_tool_embeddings, save_tool_embeddings, tool_text_hash
+
+logger = logging.getLogger(__name__)
+
+# Words of identifiers and text: "getIssueComments" and "get_issue_comments" both
+# become "get", "issue", "comments"
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+")
+
+# Queries whose ranking is kept, as a query is ranked again on every model turn
+_RANKING_CACHE_SIZE = 32
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words, splitting identifiers at case changes and underscores."""
+    return [word.lower() for word in _WORD.findall(text)]
+
+
+class BM25Index:
+    """Okapi BM25 ranking of a fixed set of documents.
+
+    Args:
+        documents (List[List[str]]): The words of every document
+        k1 (float): How quickly repeated words stop adding to the score
+        b (float): How much the score is normalized by document length
+    """
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0
+        document_freqs = Counter(term for freqs in self.term_freqs for term in freqs)
+        count = len(documents)
+        self.idf = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_freqs.items()
+        }
+
+    def scores(self, query: List[str]) -> List[float]:
+        """Score every document against the words of a query."""
+        terms = [term for term in set(query) if term in self.idf]
+        scores = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+            score = 0.0
+            for term in terms:
+                freq = freqs.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+
+def _message_text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in message.content
+    )
+
+
+def _summary(tool: BaseTool) -> str:
+    """First line of a tool's description."""
+    lines = (tool.description or "").strip().splitlines()
+    return lines[0] if lines else ""
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+def _similarities(query: List[float], vectors: List[List[float]]) -> List[float]:
+    """Cosine similarities of normalized vectors."""
+    try:
+        import numpy as np
+        return (np.asarray(vectors) @ np.asarray(query)).tolist()
+    except ImportError:
+        return [sum(q * v for q, v in zip(query, vector)) for vector in vectors]
+
+
+class ToolSelector:
+    """Pick the tools to bind to the model for a conversation turn.
+
+    Args:
+        tools (List[BaseTool]): The tools to select from
+        top_k (int): How many tools are bound for a query, besides pinned and requested tools
+        pinned_tools (Optional[List[str]]): Names of tools that are always bound
+        embeddings (Optional[Embeddings]): Model to blend embedding similarity into the ranking
+        embedding_model (Optional[str]): Name of the embedding model, keying the cached embeddings
+    """
+
+    def __init__(self, tools: List[BaseTool], top_k: int, pinned_tools: Optional[List[str]] = None,
+                 embeddings: Optional[Embeddings] = None, embedding_model: Optional[str] = None):
+        self.tools = tools
+        self.top_k = top_k
+        self.pinned_tools = set(pinned_tools or [])
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self._by_name = {tool.name: tool for tool in tools}
+        self._texts = [f"{tool.name}: {tool.description or ''}" for tool in tools]
+        self._index = BM25Index([tokenize(text) for text in self._texts])
+        self._vectors: Optional[List[List[float]]] = None
+        self._rankings: dict[str, List[str]] = {}
+
+    def __contains__(self, tool: BaseTool) -> bool:
+        return tool.name in self._by_name
+
+    async def _tool_vectors(self) -> List[List[float]]:
+        """Embed the tools, reusing the embeddings cached next to the tools cache."""
+        if self._vectors is None:
+            hashes = [tool_text_hash(text) for text in self._texts]
+            cached = get_cached_tool_embeddings(self.embedding_model, hashes)
+            missing = {text_hash: text for text_hash, text in zip(hashes, self._texts) if text_hash not in cached}
+            if missing:
+                embedded = await self.embeddings.aembed_documents(list(missing.values()))
+                new = dict(zip(missing, embedded))
+                save_tool_embeddings(self.embedding_model, new)
+                cached.update(new)
+            self._vectors = [_normalize(cached[text_hash]) for text_hash in hashes]
+        return self._vectors
+
+    async def rank(self, query: str, limit: int) -> List[BaseTool]:
+        """Return up to `limit` tools matching a query, best first.
+
+        Without embeddings, only tools sharing a word with the query are returned.
+        """
+        scores = self._index.scores(tokenize(query))
+        blended = False
+        if self.embeddings:
+            try:
+                vectors = await self._tool_vectors()
+                query_vector = _normalize(await self.embeddings.aembed_query(query))
+            except Exception as e:
+                logger.warning(f"Tool embeddings unavailable, ranking tools by keywords only: {e}")
+            else:
+                # BM25 scores are unbounded, scale them to the range of cosine similarities
+                top = max(scores) or 1.0
+                scores = [
+                    score / top + similarity
+                    for score, similarity in zip(scores, _similarities(query_vector, vectors))
+                ]
+                blended = True
+        ranked = sorted(range(len(self.tools)), key=lambda i: scores[i], reverse=True)
+        return [self.tools[i] for i in ranked[:limit] if blended or scores[i] > 0]
+
+    async def select(self, messages: List[BaseMessage]) -> List[BaseTool]:
+        """Select the tools for the next model turn of a conversation.
+
+        The tools are ranked against the latest user message, and joined by the pinned tools,
+        the tools found with `find_tools` and the tools already called since that message.
+        """
+        start = max(
+            (i for i, message in enumerate(messages) if isinstance(message, HumanMessage)),
+            default=0
+        )
+        query = _message_text(messages[start]) if messages else ""
+        if query not in self._rankings:
+            if len(self._rankings) >= _RANKING_CACHE_SIZE:
+                self._rankings.clear()
+            self._rankings[query] = [tool.name for tool in await self.rank(query, self.top_k)]
+
+        names = dict.fromkeys(self._rankings[query])
+        names.update(dict.fromkeys(name for name in self.pinned_tools if name in self._by_name))
+        for message in messages[start + 1:]:
+            if isinstance(message, AIMessage):
+                names.update(dict.fromkeys(call["name"] for call in message.tool_calls))
+            elif isinstance(message, ToolMessage) and message.name == "find_tools" and message.artifact:
+                names.update(dict.fromkeys(message.artifact))
+        return [self._by_name[name] for name in names if name in self._by_name]
+
+    def find_tools_tool(self) -> BaseTool:
+        """Build the `find_tools` tool, which binds more tools when the selected ones do not fit."""
+        async def find_tools(query: str) -> tuple[str, List[str]]:
+            tools = await self.rank(query, FIND_TOOLS_LIMIT)
+            if not tools:
+                return "No tools match the query, try other words.", []
+            listing = "\n".join(f"- {tool.name}: {_summary(tool)}" for tool in tools)
+            return f"These tools can be called from now on:\n{listing}", [tool.name for tool in tools]
+
+        return StructuredTool.from_function(
+            coroutine=find_tools,
+            name="find_tools",
+            description=(
+                "Search all available tools by what they do. Only some tools are offered at first; "
+                "call this when none of them fits the task, and the tools found can be called next."
+            ),
+            response_format="content_and_artifact",
+        )
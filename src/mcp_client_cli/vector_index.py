@@ -0,0 +1,65 @@
+"""Inverted file (IVF-flat) index for approximate memory search.
+
+The vectors are clustered with spherical k-means, and every vector is assigned to the list of
+its nearest centroid. A search only scores the vectors of the lists whose centroids are
+nearest the query, instead of every vector of the store. The vectors themselves stay in the
+store's database, which keeps the list of each vector next to it; this module only computes
+the centroids and the assignments. It requires NumPy.
+"""
+
+import math
+from typing import Any
+
+import numpy as np
+
+
+def normalize(vectors: Any) -> np.ndarray:
+    """Scale vectors, the rows of a matrix, to unit length. Zero vectors are left as they are."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def list_count(vector_count: int) -> int:
+    """Number of lists for an index of `vector_count` vectors, about its square root."""
+    return max(1, int(math.sqrt(vector_count)))
+
+
+def train_centroids(vectors: Any, lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Cluster vectors with spherical k-means.
+
+    Args:
+        vectors (Any): The training vectors, rows of a matrix
+        lists (int): Number of clusters
+        iterations (int): Rounds of assignment and centroid updates
+        seed (int): Seed of the initial centroids, picked among the vectors
+
+    Returns:
+        np.ndarray: The unit-length centroids, one per row
+    """
+    vectors = normalize(vectors)
+    lists = min(lists, len(vectors))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), lists, replace=False)]
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=lists)
+        # An empty cluster restarts from a random vector
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign(vectors: Any, centroids: np.ndarray) -> np.ndarray:
+    """Return the list of every vector: the index of its most similar centroid."""
+    return np.argmax(normalize(vectors) @ centroids.T, axis=1)
+
+
+def probe(query: Any, centroids: np.ndarray, probes: int) -> list[int]:
+    """Return the `probes` lists whose centroids are most similar to a query vector."""
+    similarities = centroids @ normalize(query)
+    probes = min(probes, len(centroids))
+    return np.argpartition(-similarities, probes - 1)[:probes].tolist()
@@ -0,0 +1,90 @@
+"""Queries served by the daemon stream their messages back to the client whole."""
+
+import argparse
+import asyncio
+import base64
+import sys
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from mcp_client_cli import daemon
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="The daemon requires Unix domain sockets")
+
+
+class FakeRuntime:
+    """Stands in for `AgentRuntime`, answering every query with a fixed conversation."""
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def get_thread_id(self, continuation):
+        return "thread"
+
+    async def save_thread_id(self, thread_id):
+        pass
+
+    def schedule_tools_refresh(self):
+        pass
+
+    async def astream(self, query, thread_id, **kwargs):
+        for i in range(1, len(self.messages) + 1):
+            yield ("values", {"messages": [query, *self.messages[:i]]})
+
+
+class RecordingOutput:
+    """Stands in for `OutputHandler`, recording what it is asked to render."""
+
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.chunks, self.errors = [], []
+        RecordingOutput.instances.append(self)
+
+    def start(self):
+        pass
+
+    def update(self, chunk):
+        self.chunks.append(chunk)
+
+    def update_error(self, error):
+        self.errors.append(error)
+
+    def finish(self):
+        pass
+
+
+def test_large_tool_result_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, "DAEMON_SOCKET", tmp_path / "daemon.sock")
+    monkeypatch.setattr(daemon, "OutputHandler", RecordingOutput)
+    image = base64.b64encode(bytes(range(256)) * 4096).decode()
+    tool_result = ToolMessage(
+        content=[
+            {"type": "text", "text": "x" * 200_000},
+            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}},
+        ],
+        tool_call_id="call",
+    )
+    messages = [
+        AIMessage(content="", tool_calls=[{"name": "read", "args": {}, "id": "call"}]),
+        tool_result,
+        AIMessage(content="done"),
+    ]
+    app_config = SimpleNamespace(source=["config.json", 1, 1])
+    args = argparse.Namespace(
+        model=None, no_tools=False, no_tool_cache=False, no_confirmations=True, text_only=True,
+        no_intermediates=False,
+    )
+
+    async def main():
+        agent_daemon = daemon.AgentDaemon(app_config)
+        agent_daemon.runtime = FakeRuntime(messages)
+        async with await agent_daemon._start_server():
+            return await daemon.run_client(args, HumanMessage(content="read"), False, app_config)
+
+    assert asyncio.run(main())
+    output = RecordingOutput.instances[-1]
+    assert output.errors == []
+    assert [chunk[1]["messages"][-1] for chunk in output.chunks] == messages
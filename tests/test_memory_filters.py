@@ -0,0 +1,72 @@
+"""Search filters pushed down to SQL match the same memories as filters matched in Python."""
+
+import asyncio
+import itertools
+
+from langgraph.store.base import PutOp
+
+from mcp_client_cli.memory import SqliteStore
+
+VALUES = [
+    None, True, False, 0, 1, 5, -3, 2 ** 53 + 1, 2 ** 63, 2 ** 70, 2.5, 5.0, float("inf"),
+    "5", " 7 ", "a", "ü", "", [1], {"x": 1},
+]
+OPERANDS = [
+    None, True, False, 0, 1, 5, -3, 2 ** 53 + 1, 2 ** 63, -2 ** 64, 2.5, 5.0, float("nan"),
+    "5", "a", "ü", [1], {"x": 1},
+]
+OPERATORS = ["$eq", "$ne", "$gt", "$gte", "$lt", "$lte"]
+
+
+def python_only(filter):
+    return [], [], dict(filter)
+
+
+async def search(store, prefix, filter, limit=1000, offset=0):
+    try:
+        items = await store.asearch(prefix, filter=filter, limit=limit, offset=offset)
+    except Exception as e:
+        return type(e).__name__
+    return [item.key for item in items]
+
+
+async def compare(tmp_path, filters):
+    store = SqliteStore(tmp_path / "conversations.db")
+    ops = []
+    for i, (a, b) in enumerate(itertools.product(VALUES + ["missing"], [1, "a", "missing"])):
+        value = {key: v for key, v in (("a", a), ("b", b)) if v != "missing"}
+        ops.append(PutOp(("memories", "x" if i % 3 else "y"), f"k{i:03}", value))
+    await store.abatch(ops)
+    reference = SqliteStore(tmp_path / "conversations.db")
+    reference._compile_filter = python_only
+    try:
+        for prefix, filter, limit, offset in filters:
+            expected = await search(reference, prefix, filter, limit, offset)
+            assert await search(store, prefix, filter, limit, offset) == expected, (prefix, filter)
+    finally:
+        await store.aclose()
+        await reference.aclose()
+
+
+def test_operators_match_python(tmp_path):
+    filters = [
+        (("memories",), {"a": {operator: operand}}, 1000, 0)
+        for operator in OPERATORS
+        for operand in OPERANDS
+    ]
+    filters += [(("memories",), {"a": operand}, 1000, 0) for operand in OPERANDS]
+    asyncio.run(compare(tmp_path, filters))
+
+
+def test_combined_filters_match_python(tmp_path):
+    filters = [
+        (("memories",), {"a": 5, "b": 1}, 1000, 0),
+        (("memories", "x"), {"a": {"$gte": 0, "$lt": 6}, "b": "a"}, 1000, 0),
+        (("memories",), {"a": {"$ne": None}, "b": {"$ne": 1}}, 5, 3),
+        (("memories", "y"), {"b": "a"}, 4, 2),
+        # A page reaching the values SQLite cannot parse, stored as Infinity
+        (("memories",), {"b": "a"}, 5, 10),
+        (("memories",), {"a": {"$gt": "5"}}, 3, 1),
+        (("memories",), {"a": {"$eq": 1, "$gt": 0}}, 1000, 0),
+    ]
+    asyncio.run(compare(tmp_path, filters))